@@ -15,15 +15,35 @@ from .routes.api import register_api_routes
 from .routes.pages import register_page_routes
 
 BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = str(BASE_DIR / "templates")
+STATIC_DIR = str(BASE_DIR / "static")
 
 
 def create_app() -> Flask:
     app = Flask(
         __name__,
-        template_folder=str(BASE_DIR / "templates"),
-        static_folder=str(BASE_DIR / "static"),
+        template_folder=TEMPLATES_DIR,
+        static_folder=STATIC_DIR,
     )
-    app.config["SECRET_KEY"] = os.environ.get("USACO_RATING_SECRET", secrets.token_hex(16))
+    app.config["SECRET_KEY"] = os.environ.get("USACO_RATING_SECRET") or secrets.token_bytes(16).hex()
+    app.config["SESSION_REFRESH_EACH_REQUEST"] = False
+
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        # Server-side sessions keep only the session id in the cookie.
+        try:
+            import redis
+            from flask_session import Session
+        except ImportError as exc:
+            raise RuntimeError(
+                "REDIS_URL is set but Flask-Session/redis are not installed; "
+                "install them with `pip install -r requirements-redis.txt`"
+            ) from exc
+
+        app.config["SESSION_TYPE"] = "redis"
+        app.config["SESSION_REDIS"] = redis.Redis.from_url(redis_url)
+        app.config["SESSION_PERMANENT"] = False
+        Session(app)
 
     datastore = DataStore()
     app.config["DATASTORE"] = datastore
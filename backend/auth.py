@@ -2,35 +2,60 @@
 
 from __future__ import annotations
 
+import hmac
 import secrets
 from typing import Any, Dict, Optional, Tuple
 
-from flask import Flask, abort, g, session
+from flask import Flask, abort, g, request, session
+
+from .datastore import USER_STATUS_ADMIN, USER_STATUS_APPROVED, USER_STATUS_BANNED
 
 
 def generate_csrf_token() -> str:
-    token = session.get("_csrf_token")
+    token = getattr(g, "_csrf_token", None)
+    if token:
+        return token
+    sess = session._get_current_object()
+    token = sess.get("_csrf_token")
     if not token:
-        token = secrets.token_hex(16)
-        session["_csrf_token"] = token
+        token = secrets.token_bytes(16).hex()
+        sess["_csrf_token"] = token
+    g._csrf_token = token
     return token
 
 
+class _TemplateCsrfToken:
+    """Template value that renders as the current request's CSRF token."""
+
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        return generate_csrf_token()
+
+    __html__ = __str__
+
+
+_TEMPLATE_CSRF_TOKEN = _TemplateCsrfToken()
+
+
 def validate_csrf(token: Optional[str]) -> bool:
-    return bool(token) and token == session.get("_csrf_token")
+    if not token:
+        return False
+    expected = session.get("_csrf_token") or ""
+    return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
 
 
 def get_active_user() -> Optional[Dict[str, Any]]:
-    user = getattr(g, "user", None)
+    user = g.user
     if not user:
         return None
-    if not user.get("approved") or user.get("banned"):
+    if user.get("_status", 0) & (USER_STATUS_APPROVED | USER_STATUS_BANNED) != USER_STATUS_APPROVED:
         return None
     return user
 
 
 def require_login() -> Dict[str, Any]:
-    user = getattr(g, "user", None)
+    user = g.user
     if not user:
         abort(401)
     return user
@@ -38,18 +63,19 @@ def require_login() -> Dict[str, Any]:
 
 def require_admin() -> Dict[str, Any]:
     user = require_login()
-    if not user.get("is_admin"):
+    if not user.get("_status", 0) & USER_STATUS_ADMIN:
         abort(403)
     return user
 
 
 def api_user_guard() -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, str]]]:
-    user = getattr(g, "user", None)
+    user = g.user
     if not user:
         return None, {"error": "Not logged in"}
-    if not user.get("approved"):
+    status = user.get("_status", 0)
+    if not status & USER_STATUS_APPROVED:
         return None, {"error": "Account pending approval"}
-    if user.get("banned"):
+    if status & USER_STATUS_BANNED:
         return None, {"error": "Account banned"}
     return user, None
 
@@ -58,15 +84,25 @@ def init_auth(app: Flask) -> None:
     """Register session hooks and context processors on the app."""
 
     datastore = app.config["DATASTORE"]
+    static_prefix = (app.static_url_path or "/static").rstrip("/") + "/"
 
     @app.before_request
     def load_current_user() -> None:
-        user_id = session.get("user_id")
-        g.user = datastore.find_user_by_id(user_id) if user_id else None
-        if g.user and g.user.get("banned"):
-            session.pop("user_id", None)
+        if request.path.startswith(static_prefix):
+            g.user = None
+            return
+        sess = session._get_current_object()
+        user_id = sess.get("user_id")
+        if not user_id:
             g.user = None
+            return
+        user = datastore.find_user_by_id(user_id)
+        if user and user.get("_status", 0) & USER_STATUS_BANNED:
+            # Dropping user_id means later requests never reach the datastore.
+            sess.pop("user_id", None)
+            user = None
+        g.user = user
 
     @app.context_processor
     def inject_globals() -> Dict[str, Any]:
-        return {"csrf_token": generate_csrf_token}
+        return {"csrf_token": _TEMPLATE_CSRF_TOKEN}
@@ -2,17 +2,31 @@
 
 from __future__ import annotations
 
+import atexit
+import bisect
+import copy
+import functools
 import json
+import math
+import mmap
+import os
 import time
 import hashlib
 from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from threading import RLock
-from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from threading import RLock, Timer, get_ident
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union
 
 from werkzeug.security import check_password_hash, generate_password_hash
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speed-up; fall back to the stdlib.
+    orjson = None
+
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 PROBLEMS_PATH = DATA_DIR / "problems.json"
@@ -44,8 +58,99 @@ DEFAULT_STORE_PAYLOAD: Dict[str, Any] = {
     "next_category_id": 1,
     "users": [],
 }
+# Store keys _load_store guarantees, filled from DEFAULT_STORE_PAYLOAD when missing.
+STORE_REQUIRED_KEYS = (
+    "announcements",
+    "reports",
+    "problem_overrides",
+    "custom_problems",
+    "custom_types",
+    "course_contests",
+    "course_categories",
+    "type_categories",
+    "next_user_id",
+    "next_vote_id",
+    "next_contest_id",
+    "next_category_id",
+    "next_report_id",
+)
 DEFAULT_ANNOUNCEMENTS_SEED: Dict[str, Any] = {"announcements": []}
 
+# Seconds to wait before writing store changes, so bursts of mutations share one write.
+STORE_FLUSH_DELAY = float(os.environ.get("USACO_RATING_FLUSH_DELAY", "0.2") or 0.2)
+
+# Store keys written as soon as they change rather than after STORE_FLUSH_DELAY: an id
+# counter or user record still waiting in memory would let another process sharing the
+# data directory hand out the same id or overwrite the change.
+STORE_SYNC_KEYS = frozenset({
+    "users",
+    "next_user_id",
+    "next_vote_id",
+    "next_contest_id",
+    "next_category_id",
+    "next_report_id",
+    "next_problem_id",
+    "next_type_id",
+    "next_announcement_id",
+})
+
+# Key for the votes directory's own mtime among the per-file store mtimes.
+VOTES_DIR_MTIME_KEY = "votes/"
+
+# Seconds between checks of the store files for changes made by other processes;
+# 0 checks on every access.
+STORE_CHECK_INTERVAL = float(os.environ.get("USACO_RATING_STORE_CHECK_INTERVAL", "0.25") or 0.0)
+
+# Indent store segments and vote buckets on disk, for reading or diffing them by hand.
+STORE_PRETTY_JSON = os.environ.get("USACO_RATING_PRETTY_STORE", "").lower() in ("1", "true", "yes")
+
+# Buffer size for data file writes.
+WRITE_BUFFER_SIZE = 64 * 1024
+
+# Data files at least this large are memory-mapped for orjson instead of read into bytes.
+MMAP_MIN_SIZE = 1024 * 1024
+
+# Bumped whenever the normalisation in _load_store changes; stores stamped with the
+# current version skip re-validating their users, reports, courses, categories and
+# contests.
+STORE_SCHEMA_VERSION = 2
+
+# Werkzeug hash method for new passwords (e.g. "scrypt" or "pbkdf2:sha256:100000");
+# empty means Werkzeug's default.
+PASSWORD_HASH_METHOD = os.environ.get("USACO_RATING_PASSWORD_HASH", "")
+
+# d/dm of 10 ** ((x - m) / 400) is -ELO_LOG_SCALE times itself.
+ELO_LOG_SCALE = math.log(10) / 400.0
+
+# Parsed read-only data files keyed by path -> (st_mtime_ns, st_size, payload).
+_JSON_CACHE: Dict[Path, Tuple[int, int, Any]] = {}
+
+# Bit flags cached on each user record under "_status" for the auth guards.
+USER_STATUS_APPROVED = 1
+USER_STATUS_BANNED = 2
+USER_STATUS_ADMIN = 4
+
+# Fields filled in on new custom problems; None for setter/source/tags/meta is
+# replaced with a fresh container by create_problem.
+CUSTOM_PROBLEM_DEFAULTS: Dict[str, Any] = {
+    "meta": None,
+    "setter": None,
+    "source": None,
+    "url": "",
+    "description": "",
+    "contest": "",
+    "tags": None,
+    "knowledge_difficulty": None,
+    "avg_difficulty": None,
+    "avg_quality": None,
+    "sd_difficulty": None,
+    "sd_quality": None,
+    "cnt1": 0,
+    "cnt2": 0,
+    "medium_difficulty": None,
+    "medium_quality": None,
+}
+
 PROBLEM_STATS_SPECS = {
     "overall": {"avg": "avg_difficulty", "sd": "sd_difficulty", "cnt": "cnt1"},
     "thinking": {"avg": "avg_thinking", "sd": "sd_thinking", "cnt": "cnt_thinking"},
@@ -89,12 +194,136 @@ class StoreDict(dict):
         super().__setitem__(key, value)
 
 
+def _json_loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(payload: Any, *, indent: bool = True) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(payload, option=option)
+    return json.dumps(payload, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _read_json_file(path: Path) -> Any:
+    """Parse a JSON file; raises ``OSError`` if unreadable and ``JSONDecodeError`` if blank or invalid."""
+
+    if orjson is not None and path.stat().st_size >= MMAP_MIN_SIZE:
+        # orjson parses straight from the mapped pages, so no bytes copy of the file is made.
+        with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return orjson.loads(view)
+    raw = path.read_bytes()
+    if not raw or raw.isspace():
+        raise json.JSONDecodeError("empty file", "", 0)
+    return _json_loads(raw)
+
+
+def _write_json_atomic(path: Path, payload: Any, *, indent: bool = False) -> None:
+    # Unique per writer so concurrent flushes never rename each other's temp file.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb", buffering=WRITE_BUFFER_SIZE) as handle:
+            if isinstance(payload, list) and not indent:
+                # Encode list segments item by item so a large one never exists as a single bytes object.
+                handle.write(b"[")
+                for index, item in enumerate(payload):
+                    if index:
+                        handle.write(b",")
+                    handle.write(_json_dumps(item, indent=False))
+                handle.write(b"]")
+            else:
+                handle.write(_json_dumps(payload, indent=indent))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def _fsync_dir(path: Path) -> None:
+    """Make renames inside ``path`` durable; a no-op where directories cannot be opened."""
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
 def _clone_payload(payload: Any) -> Any:
-    return json.loads(json.dumps(payload, ensure_ascii=False))
+    return _json_loads(_json_dumps(payload, indent=False))
+
+
+def _storable_segment(key: str, payload: Any) -> Any:
+    """Return a store segment as written to disk, without fields derived in memory."""
+
+    if key == "custom_problems":
+        # Running sums are rebuilt from the vote buckets on load; keep them out of the file.
+        return [
+            {field: value for field, value in item.items() if field != "_stats"} if "_stats" in item else item
+            for item in payload
+        ]
+    if key == "users":
+        # The status bits are recomputed by _refresh_user_status on load.
+        return [
+            {field: value for field, value in user.items() if field != "_status"} if "_status" in user else user
+            for user in payload
+        ]
+    return payload
 
 
 def _clone_default(payload: Any) -> Any:
-    return _clone_payload(payload)
+    return copy.deepcopy(payload)
+
+
+def _hash_password(password: str) -> str:
+    if PASSWORD_HASH_METHOD:
+        return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+    return generate_password_hash(password)
+
+
+_password_hash_prefix: Optional[str] = None
+
+
+def _password_needs_rehash(password_hash: str) -> bool:
+    """Whether ``password_hash`` was made with a method other than the configured one."""
+
+    global _password_hash_prefix
+    if not PASSWORD_HASH_METHOD:
+        return False
+    if _password_hash_prefix is None:
+        # Werkzeug expands defaults (e.g. iteration counts) into the prefix, so take
+        # it from a real hash rather than from the configured string.
+        _password_hash_prefix = _hash_password("").split("$", 1)[0]
+    return password_hash.split("$", 1)[0] != _password_hash_prefix
+
+
+def _pop_by_id(items: List[Dict[str, Any]], item_id: int) -> Optional[Dict[str, Any]]:
+    """Remove the entry with ``item_id`` from ``items`` in place and return it."""
+
+    for index, item in enumerate(items):
+        if item.get("id") == item_id:
+            return items.pop(index)
+    return None
+
+
+def _announcement_sort_key(item: Dict[str, Any]) -> Tuple[bool, int]:
+    # Pinned first, then newest first.
+    return (not item.get("pinned"), -item["created_at"])
 
 
 def _now_ts() -> int:
@@ -105,11 +334,47 @@ def _sha256_hex(value: str) -> str:
     return hashlib.sha256(value.encode("utf-8")).hexdigest()
 
 
+def _refresh_user_status(user: Dict[str, Any]) -> None:
+    user["_status"] = (
+        (USER_STATUS_APPROVED if user.get("approved") else 0)
+        | (USER_STATUS_BANNED if user.get("banned") else 0)
+        | (USER_STATUS_ADMIN if user.get("is_admin") else 0)
+    )
+
+
 def _elo_win_probability(a: float, b: float) -> float:
     return 1.0 / (1 + 10 ** ((b - a) / 400.0))
 
 
+@functools.lru_cache(maxsize=8192)
 def _calc_overall(thinking: float, implementation: float) -> float:
+    """Rating ``m`` at which beating both ``thinking`` and ``implementation`` is a coin flip.
+
+    Solved by Newton's method on ``p(m, a) * p(m, b) - 0.5``, which converges in a
+    handful of steps from the seed below; falls back to bisection if a step stalls
+    or leaves the ``[1, 8000]`` range. Memoized, so callers round their inputs to
+    0.1 to keep repeated pairs hitting the cache.
+    """
+
+    m = (thinking + implementation) / 2 + 200
+    for _ in range(8):
+        ea = 10 ** ((thinking - m) / 400.0)
+        eb = 10 ** ((implementation - m) / 400.0)
+        pa = 1.0 / (1 + ea)
+        pb = 1.0 / (1 + eb)
+        df = ELO_LOG_SCALE * pa * pb * (pa * ea + pb * eb)
+        if abs(df) < 1e-12:
+            break
+        step = (pa * pb - 0.5) / df
+        m -= step
+        if not 1.0 <= m <= 8000.0:
+            break
+        if abs(step) < 1e-6:
+            return m
+    return _calc_overall_bisect(thinking, implementation)
+
+
+def _calc_overall_bisect(thinking: float, implementation: float) -> float:
     left = 1.0
     right = 8000.0
     eps = 1e-4
@@ -122,15 +387,64 @@ def _calc_overall(thinking: float, implementation: float) -> float:
     return left
 
 
+def _materialize_metric(problem: Dict[str, Any], metric: str, block: Dict[str, float]) -> None:
+    mapping = PROBLEM_STATS_SPECS[metric]
+    count = block["count"]
+    if count <= 0:
+        problem[mapping["cnt"]] = 0
+        problem[mapping["avg"]] = None
+        problem[mapping["sd"]] = None
+        return
+    inv_count = 1.0 / count
+    avg = block["sum"] * inv_count
+    variance = max(0.0, block["sum_sq"] * inv_count - avg * avg)
+    problem[mapping["cnt"]] = count
+    problem[mapping["avg"]] = avg
+    problem[mapping["sd"]] = variance ** 0.5
+
+
+def _update_metric(block: Dict[str, float], old_value: Optional[float], new_value: Optional[float]) -> bool:
+    """Move one vote's contribution to ``block`` from ``old_value`` to ``new_value``.
+
+    ``None`` on either side means the vote does not count towards the metric.
+    Returns ``False`` when the running sums are left untouched.
+    """
+
+    if old_value == new_value:
+        return False
+    if old_value is None:
+        block["count"] += 1
+        block["sum"] += new_value
+        block["sum_sq"] += new_value * new_value
+        return True
+    if new_value is None:
+        count = block["count"] - 1
+        if count <= 0:
+            block["count"] = 0
+            block["sum"] = 0.0
+            block["sum_sq"] = 0.0
+            return True
+        block["count"] = count
+        block["sum"] -= old_value
+        sum_sq = block["sum_sq"] - old_value * old_value
+    else:
+        block["sum"] += new_value - old_value
+        sum_sq = block["sum_sq"] + new_value * new_value - old_value * old_value
+    block["sum_sq"] = sum_sq if sum_sq > 0.0 else 0.0
+    return True
+
+
 def _median(values: List[float]) -> Optional[float]:
+    """Median of ``values``; sorts the list in place, so pass a list you own."""
+
     if not values:
         return None
-    sorted_vals = sorted(values)
-    n = len(sorted_vals)
+    values.sort()
+    n = len(values)
     mid = n // 2
     if n % 2 == 1:
-        return sorted_vals[mid]
-    return (sorted_vals[mid - 1] + sorted_vals[mid]) / 2
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2
 
 
 class DataStore:
@@ -140,7 +454,12 @@ class DataStore:
         self.custom_types: Dict[int, Dict[str, Any]] = {}
         self.course_categories: Dict[int, Dict[str, Any]] = {}
         self.type_categories: Dict[int, List[int]] = {}
-        self._store_mtime: float = 0.0
+        # Int-keyed view of store["course_contests"]; both maps share the same lists.
+        self.course_contests: Dict[int, List[Dict[str, Any]]] = {}
+        self._category_to_types: Dict[int, List[int]] = {}
+        self._category_ids_by_name: Dict[str, int] = {}
+        self._type_ids_by_name: Dict[str, int] = {}
+        self._store_mtimes: Dict[str, float] = {}
         self._persisted_store: Dict[str, Any] = {}
         self.store: StoreDict = StoreDict(self)
         self._votes_dir = VOTES_DIR
@@ -148,14 +467,38 @@ class DataStore:
         self._votes_cache_mtime: Dict[int, float] = {}
         self._votes_dirty: Set[int] = set()
         self._vote_index: Dict[int, int] = {}
+        self._vote_problems_by_user: Dict[int, Set[int]] = {}
+        # Bucket file mtimes the two vote indexes above were last built from.
+        self._vote_index_mtimes: Dict[int, float] = {}
+        self._sorted_announcements: Optional[List[Dict[str, Any]]] = None
+        self._announcement_sort_keys: List[Tuple[bool, int]] = []
+        self._newest_announcement_ts: Optional[int] = None
+        self._sorted_types: Optional[List[Dict[str, Any]]] = None
+        self._type_groups: Optional[List[Dict[str, Any]]] = None
+        self._sorted_categories: Optional[List[Dict[str, Any]]] = None
+        self._type_problem_lists: Dict[int, List[Dict[str, Any]]] = {}
+        self.custom_problem_ids: Set[int] = set()
         self._votes_lock = RLock()
         self._votes_dir_mtime: float = 0.0
         self._votes_snapshot: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._users_by_id: Dict[int, Dict[str, Any]] = {}
+        self._users_by_username: Dict[str, Dict[str, Any]] = {}
+        self._reports_by_vote: Dict[int, List[Dict[str, Any]]] = {}
+        # One lock guards both the vote buckets and the store segments, so a flush
+        # writing both can never deadlock against a mutator.
+        self._store_lock = self._votes_lock
+        self._pending_store_keys: Set[str] = set()
+        self._pending_vote_buckets: Set[int] = set()
+        self._pending_full_save = False
+        self._flush_timer: Optional[Timer] = None
+        self._last_fresh_check = 0.0
+        self._batch_depth = 0
+        atexit.register(self.flush)
         self._load_store()
         self._bootstrap_announcements()
 
     def _load_types(self) -> None:
-        payload = self._load_json_file(TYPES_PATH, DEFAULT_TYPES_PAYLOAD)
+        payload = self._load_json_file(TYPES_PATH, DEFAULT_TYPES_PAYLOAD, shared=True)
         self.types = {item["id"]: item for item in payload["types"]}
         self.type_groups = []
         for group in payload.get("groups", []):
@@ -167,20 +510,25 @@ class DataStore:
         payload: Dict[str, Any] = self._load_json_file(PROBLEMS_PATH, DEFAULT_PROBLEMS_PAYLOAD)
         self.problems_by_type: Dict[int, Dict[str, Any]] = {}
         self.problem_map: Dict[int, Dict[str, Any]] = {}
+        problem_map = self.problem_map
+        fill_defaults = self._fill_problem_defaults
+        # The payload was parsed for this instance alone, so its records are adopted in place.
         for type_key, info in payload.items():
             type_id = int(type_key)
             type_info = info.get("type", self.types.get(type_id, {"id": type_id, "name": ""}))
-            problems = []
-            for item in info.get("problems", []):
-                item = dict(item)
-                item["type"] = item.get("type", type_id)
-                item.setdefault("setter", [])
-                item.setdefault("source", [])
-                item.setdefault("meta", {})
-                self._init_problem_stats(item)
-                self.problem_map[item["id"]] = item
-                problems.append(item)
-            self.problems_by_type[type_id] = {"type": type_info, "problems": problems}
+            problems = info.get("problems") or []
+            for item in problems:
+                if "type" not in item:
+                    item["type"] = type_id
+                if "setter" not in item:
+                    item["setter"] = []
+                if "source" not in item:
+                    item["source"] = []
+                if "meta" not in item:
+                    item["meta"] = {}
+                fill_defaults(item)
+                problem_map[item["id"]] = item
+            self.problems_by_type[type_id] = {"type": type_info, "problems": {item["id"]: item for item in problems}}
         self.next_problem_id = max(self.problem_map.keys(), default=0) + 1
 
     def _load_store_payload(self) -> Dict[str, Any]:
@@ -193,16 +541,9 @@ class DataStore:
     def _load_segmented_store(self, files: Iterable[Path]) -> Dict[str, Any]:
         payload: Dict[str, Any] = {}
         for path in files:
-            key = path.stem
-            try:
-                text = path.read_text(encoding="utf-8").strip()
-            except OSError:
-                continue
-            if not text:
-                continue
             try:
-                payload[key] = json.loads(text)
-            except json.JSONDecodeError:
+                payload[path.stem] = _read_json_file(path)
+            except (OSError, json.JSONDecodeError):
                 continue
         for key, default in DEFAULT_STORE_PAYLOAD.items():
             if key not in payload:
@@ -249,7 +590,7 @@ class DataStore:
         if implementation is None and legacy_difficulty is not None:
             implementation = legacy_difficulty
         if overall is None and thinking is not None and implementation is not None:
-            overall = _calc_overall(float(thinking), float(implementation))
+            overall = _calc_overall(round(float(thinking), 1), round(float(implementation), 1))
         elif overall is None:
             overall = legacy_difficulty
         vote["thinking"] = float(thinking) if thinking is not None else None
@@ -269,17 +610,9 @@ class DataStore:
 
     def _read_votes_from_disk(self, problem_id: int) -> List[Dict[str, Any]]:
         path = self._vote_file(problem_id)
-        if not path.exists():
-            return []
-        try:
-            text = path.read_text(encoding="utf-8").strip()
-        except OSError:
-            return []
-        if not text:
-            return []
         try:
-            raw_votes = json.loads(text)
-        except json.JSONDecodeError:
+            raw_votes = _read_json_file(path)
+        except (OSError, json.JSONDecodeError):
             return []
         normalised: List[Dict[str, Any]] = []
         for entry in raw_votes or []:
@@ -291,13 +624,20 @@ class DataStore:
         return normalised
 
     def _get_vote_bucket(self, problem_id: int, *, clone: bool = False) -> List[Dict[str, Any]]:
-        with self._votes_lock:
-            path = self._vote_file(problem_id)
+        path = self._vote_file(problem_id)
+        try:
+            latest_mtime = path.stat().st_mtime
+        except FileNotFoundError:
             latest_mtime = 0.0
-            try:
-                latest_mtime = path.stat().st_mtime
-            except FileNotFoundError:
-                latest_mtime = 0.0
+        # Readers of a bucket that is already cached and current skip the lock, so
+        # they never queue behind a writer; only loading from disk is serialised.
+        cached = self._votes_cache.get(problem_id)
+        if cached is not None and (
+            problem_id in self._votes_dirty
+            or latest_mtime <= self._votes_cache_mtime.get(problem_id, -1.0)
+        ):
+            return [dict(vote) for vote in cached] if clone else cached
+        with self._votes_lock:
             cached = self._votes_cache.get(problem_id)
             cached_mtime = self._votes_cache_mtime.get(problem_id, -1.0)
             if (
@@ -308,16 +648,45 @@ class DataStore:
                 self._votes_cache[problem_id] = cached
                 self._votes_cache_mtime[problem_id] = latest_mtime
                 self._votes_dirty.discard(problem_id)
+                if latest_mtime != self._vote_index_mtimes.get(problem_id, 0.0):
+                    # Rewritten by another program since it was indexed.
+                    self._reindex_vote_bucket(problem_id, cached)
+                    self._vote_index_mtimes[problem_id] = latest_mtime
             if clone:
                 return [dict(vote) for vote in cached]
             return cached
 
+    def _reindex_vote_bucket(self, problem_id: int, votes: List[Dict[str, Any]]) -> None:
+        """Point the vote indexes and snapshot at a bucket just re-read from disk."""
+
+        if problem_id in self._vote_index_mtimes:
+            stale_ids = [vid for vid, pid in self._vote_index.items() if pid == problem_id]
+            for vid in stale_ids:
+                del self._vote_index[vid]
+            for problem_ids in self._vote_problems_by_user.values():
+                problem_ids.discard(problem_id)
+            self._snapshot_remove_ids(stale_ids)
+        for vote in votes:
+            vid = vote.get("id")
+            if not isinstance(vid, int):
+                continue
+            self._vote_index[vid] = problem_id
+            self._index_vote_owner(vote, problem_id)
+            self._snapshot_upsert(vote)
+
     def _set_vote_bucket(self, problem_id: int, votes: List[Dict[str, Any]]) -> None:
         with self._votes_lock:
             self._votes_cache[problem_id] = votes
             self._votes_dirty.add(problem_id)
 
     def _save_vote_bucket(self, problem_id: int) -> None:
+        """Schedule a problem's vote bucket to be written with the next flush."""
+
+        with self._store_lock:
+            self._pending_vote_buckets.add(problem_id)
+            self._schedule_flush()
+
+    def _write_vote_bucket(self, problem_id: int) -> None:
         with self._votes_lock:
             bucket = self._votes_cache.get(problem_id, [])
             if problem_id not in self._votes_dirty and self._vote_file(problem_id).exists():
@@ -325,7 +694,7 @@ class DataStore:
             self._ensure_votes_dir()
             path = self._vote_file(problem_id)
             if bucket:
-                path.write_text(json.dumps(bucket, ensure_ascii=False, indent=2), encoding="utf-8")
+                _write_json_atomic(path, bucket, indent=STORE_PRETTY_JSON)
             else:
                 try:
                     path.unlink()
@@ -336,8 +705,8 @@ class DataStore:
             except FileNotFoundError:
                 mtime = 0.0
             self._votes_cache_mtime[problem_id] = mtime
+            self._vote_index_mtimes[problem_id] = mtime
             self._votes_dirty.discard(problem_id)
-            self._votes_dir_mtime = self._compute_votes_dir_mtime()
 
     def _iter_vote_files(self) -> Iterable[Path]:
         if not self._votes_dir.exists():
@@ -355,31 +724,32 @@ class DataStore:
                 yield problem_id, vote
 
     def _compute_votes_dir_mtime(self) -> float:
-        latest = 0.0
-        if self._votes_dir.exists():
-            for path in self._votes_dir.glob("*.json"):
-                try:
-                    mtime = path.stat().st_mtime
-                except FileNotFoundError:
-                    continue
-                if mtime > latest:
-                    latest = mtime
+        # Buckets are only ever replaced by rename, which bumps the directory's own
+        # mtime, so one stat covers every bucket however many there are.
         try:
-            dir_mtime = self._votes_dir.stat().st_mtime
-            latest = max(latest, dir_mtime)
+            return self._votes_dir.stat().st_mtime
         except FileNotFoundError:
-            pass
-        return latest
+            return 0.0
 
     def _reindex_votes(self) -> Dict[int, Optional[int]]:
         vote_owner_map: Dict[int, Optional[int]] = {}
         self._vote_index.clear()
-        for problem_id, vote in self._iter_all_votes():
-            vid = vote.get("id")
-            if not isinstance(vid, int):
+        self._vote_problems_by_user.clear()
+        self._vote_index_mtimes.clear()
+        for path in self._iter_vote_files():
+            try:
+                problem_id = int(path.stem)
+                # Taken before the read, so a rewrite racing with it still reads as newer.
+                self._vote_index_mtimes[problem_id] = path.stat().st_mtime
+            except (ValueError, FileNotFoundError):
                 continue
-            self._vote_index[vid] = problem_id
-            vote_owner_map[vid] = vote.get("user_id")
+            for vote in self._read_votes_from_disk(problem_id):
+                vid = vote.get("id")
+                if not isinstance(vid, int):
+                    continue
+                self._vote_index[vid] = problem_id
+                self._index_vote_owner(vote, problem_id)
+                vote_owner_map[vid] = vote.get("user_id")
         self._votes_dir_mtime = self._compute_votes_dir_mtime()
         self._refresh_votes_snapshot()
         return vote_owner_map
@@ -389,11 +759,20 @@ class DataStore:
         pid = vote.get("problem_id")
         if isinstance(vid, int) and isinstance(pid, int):
             self._vote_index[vid] = pid
+            self._index_vote_owner(vote, pid)
 
     def _deregister_vote(self, vote: Dict[str, Any]) -> None:
         vid = vote.get("id")
         if isinstance(vid, int):
             self._vote_index.pop(vid, None)
+        problem_ids = self._vote_problems_by_user.get(vote.get("user_id"))
+        if problem_ids is not None:
+            problem_ids.discard(vote.get("problem_id"))
+
+    def _index_vote_owner(self, vote: Dict[str, Any], problem_id: int) -> None:
+        user_id = vote.get("user_id")
+        if isinstance(user_id, int):
+            self._vote_problems_by_user.setdefault(user_id, set()).add(problem_id)
 
     def _import_votes_from_payload(self, votes_payload: Iterable[Dict[str, Any]]) -> None:
         if not votes_payload:
@@ -463,6 +842,8 @@ class DataStore:
                 except FileNotFoundError:
                     pass
             self._vote_index.clear()
+            self._vote_problems_by_user.clear()
+            self._vote_index_mtimes.clear()
             for problem_id, votes in sorted(grouped.items(), key=lambda item: item[0]):
                 votes_sorted = sorted(votes, key=lambda item: item.get("id", 0))
                 self._votes_cache[problem_id] = votes_sorted
@@ -472,10 +853,12 @@ class DataStore:
                     vid = vote.get("id")
                     if isinstance(vid, int):
                         self._vote_index[vid] = problem_id
+                        self._index_vote_owner(vote, problem_id)
                         ordered_snapshot[vid] = dict(vote)
             self._votes_snapshot = ordered_snapshot
+        # Written straight away: callers such as the store migration re-read the buckets from disk.
         for problem_id in grouped.keys():
-            self._save_vote_bucket(problem_id)
+            self._write_vote_bucket(problem_id)
         self._votes_dir_mtime = self._compute_votes_dir_mtime()
         self._rebuild_problem_stats()
         if max_vote_id and self.store.get("next_vote_id", 1) <= max_vote_id:
@@ -502,29 +885,44 @@ class DataStore:
                 self._votes_cache_mtime.pop(problem_id, None)
                 self._votes_dirty.discard(problem_id)
 
-    def _load_store(self) -> None:
+    def _load_store(self, overrides: Optional[Dict[str, Any]] = None) -> None:
         raw_store = self._load_store_payload()
+        if overrides:
+            # Segments changed in memory but not yet flushed win over their files.
+            raw_store.update(overrides)
+        trusted = raw_store.get("schema_version") == STORE_SCHEMA_VERSION
+        try:
+            self._apply_store(raw_store, trusted=trusted)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            if not trusted:
+                raise
+            # A segment edited outside the app (by hand or by a script) no longer has
+            # the shape its schema stamp promises; load it again and normalise it all.
+            raw_store = self._load_store_payload()
+            if overrides:
+                raw_store.update(overrides)
+            self._apply_store(raw_store, trusted=False)
+
+    def _apply_store(self, raw_store: Dict[str, Any], *, trusted: bool) -> None:
         legacy_votes_payload = raw_store.pop("votes", None)
         self.store.clear()
         self.store.update(raw_store)
         self._evict_vote_cache()
         self._vote_index.clear()
+        self._vote_problems_by_user.clear()
+        self._type_problem_lists.clear()
+        self._sorted_announcements = None
+        self._newest_announcement_ts = None
+        self._sorted_categories = None
         self.course_categories.clear()
         self.type_categories.clear()
-        self.store.setdefault("announcements", [])
-        self.store.setdefault("reports", [])
-        self.store.setdefault("problem_overrides", {})
-        self.store.setdefault("custom_problems", [])
-        self.store.setdefault("custom_types", [])
-        self.store.setdefault("course_contests", {})
-        self.store.setdefault("course_categories", [])
-        self.store.setdefault("type_categories", {})
-        self.store.setdefault("next_problem_id", self.next_problem_id)
-        self.store.setdefault("next_user_id", 1)
-        self.store.setdefault("next_vote_id", 1)
-        self.store.setdefault("next_contest_id", 1)
-        self.store.setdefault("next_category_id", 1)
-        self.store.setdefault("next_report_id", 1)
+        self.course_contests.clear()
+        store = self.store
+        for key in STORE_REQUIRED_KEYS:
+            if key not in store:
+                store[key] = _clone_default(DEFAULT_STORE_PAYLOAD[key])
+        if "next_problem_id" not in store:
+            store["next_problem_id"] = self.next_problem_id
 
         if isinstance(legacy_votes_payload, dict):
             candidate = legacy_votes_payload.get("votes")
@@ -533,43 +931,53 @@ class DataStore:
         if isinstance(legacy_votes_payload, list):
             self._import_votes_from_payload(legacy_votes_payload)
 
-        self._load_custom_types_from_store()
+        self._load_custom_types_from_store(trusted=trusted)
 
         # Ensure custom problems are reloaded from disk without duplicating previous entries.
-        existing_custom_ids = [pid for pid, problem in self.problem_map.items() if problem.get("is_custom")]
-        for pid in existing_custom_ids:
+        # custom_problem_ids already names them, so the static problems are not scanned.
+        for pid in self.custom_problem_ids:
             problem = self.problem_map.pop(pid, None)
             if not problem:
                 continue
             bucket = self.problems_by_type.get(problem.get("type"))
             if bucket:
-                bucket["problems"] = [item for item in bucket.get("problems", []) if item.get("id") != pid]
+                bucket["problems"].pop(pid, None)
+        self.custom_problem_ids.clear()
 
         users = self.store.setdefault("users", [])
-        for user in users:
-            if "password" in user and not user.get("legacy_password_hash"):
-                user["legacy_password_hash"] = user.pop("password")
-            user.setdefault("password_hash", None)
-            user.setdefault("legacy_password_hash", None)
-            user.setdefault("approved", user.get("is_admin", False))
-            user.setdefault("banned", False)
-            user.setdefault("roles", [])
-            user.setdefault("tag_permissions", [])
-            user.setdefault("luoguid", "")
-            user.setdefault("info", "")
-            user.setdefault("created_at", _now_ts())
-            user["default_course_id"] = self._normalise_course_id(user.get("default_course_id"))
-            if user.get("is_admin") and "admin" not in user["roles"]:
-                user["roles"].append("admin")
-            # Ensure tag permissions are unique strings
-            normalised_perms = []
-            seen_perm = set()
-            for perm in user.get("tag_permissions", []) or []:
-                perm_str = str(perm).strip()
-                if perm_str and perm_str not in seen_perm:
-                    seen_perm.add(perm_str)
-                    normalised_perms.append(perm_str)
-            user["tag_permissions"] = normalised_perms
+        if trusted:
+            # Every writer keeps user records complete; only the derived fields and
+            # references to courses (which may have changed) are refreshed.
+            for user in users:
+                user["default_course_id"] = self._normalise_course_id(user.get("default_course_id"))
+                _refresh_user_status(user)
+        else:
+            for user in users:
+                if "password" in user and not user.get("legacy_password_hash"):
+                    user["legacy_password_hash"] = user.pop("password")
+                user.setdefault("password_hash", None)
+                user.setdefault("legacy_password_hash", None)
+                user.setdefault("approved", user.get("is_admin", False))
+                user.setdefault("banned", False)
+                user.setdefault("roles", [])
+                user.setdefault("tag_permissions", [])
+                user.setdefault("luoguid", "")
+                user.setdefault("info", "")
+                user.setdefault("created_at", _now_ts())
+                user["default_course_id"] = self._normalise_course_id(user.get("default_course_id"))
+                if user.get("is_admin") and "admin" not in user["roles"]:
+                    user["roles"].append("admin")
+                # Ensure tag permissions are unique strings
+                normalised_perms = []
+                seen_perm = set()
+                for perm in user.get("tag_permissions", []) or []:
+                    perm_str = str(perm).strip()
+                    if perm_str and perm_str not in seen_perm:
+                        seen_perm.add(perm_str)
+                        normalised_perms.append(perm_str)
+                user["tag_permissions"] = normalised_perms
+                _refresh_user_status(user)
+        self._reindex_users()
         vote_owner_map = self._reindex_votes()
         if self._vote_index:
             max_vote_id = max(self._vote_index.keys())
@@ -581,56 +989,61 @@ class DataStore:
         seen_report_ids: Set[int] = set()
         seen_pairs: Set[Tuple[int, int]] = set()
         normalised_reports: List[Dict[str, Any]] = []
-        for raw_report in reports:
-            report = dict(raw_report)
-            try:
-                rid_val = int(report.get("id", 0) or 0)
-            except (TypeError, ValueError):
-                rid_val = 0
-            if rid_val <= 0 or rid_val in seen_report_ids:
-                rid_val = next_report_id
-                next_report_id += 1
-            report["id"] = rid_val
-            seen_report_ids.add(rid_val)
-
-            reporter_raw = report.get("user_id", report.get("reporter_id"))
-            reporter_id = None
-            if reporter_raw is not None:
+        if trusted:
+            seen_report_ids.update(report["id"] for report in reports)
+            normalised_reports = reports
+        else:
+            for raw_report in reports:
+                report = dict(raw_report)
                 try:
-                    reporter_id = int(reporter_raw)
+                    rid_val = int(report.get("id", 0) or 0)
                 except (TypeError, ValueError):
-                    reporter_id = None
-            if reporter_id is not None and reporter_id <= 0:
+                    rid_val = 0
+                if rid_val <= 0 or rid_val in seen_report_ids:
+                    rid_val = next_report_id
+                    next_report_id += 1
+                report["id"] = rid_val
+                seen_report_ids.add(rid_val)
+
+                reporter_raw = report.get("user_id", report.get("reporter_id"))
                 reporter_id = None
-            report["user_id"] = reporter_id
-            report["reporter_id"] = reporter_id
-
-            try:
-                vote_id = int(report.get("vote_id", 0) or 0)
-            except (TypeError, ValueError):
-                vote_id = 0
-            report["vote_id"] = vote_id
+                if reporter_raw is not None:
+                    try:
+                        reporter_id = int(reporter_raw)
+                    except (TypeError, ValueError):
+                        reporter_id = None
+                if reporter_id is not None and reporter_id <= 0:
+                    reporter_id = None
+                report["user_id"] = reporter_id
+                report["reporter_id"] = reporter_id
 
-            if report.get("target_user_id") is None and vote_id in vote_owner_map:
-                report["target_user_id"] = vote_owner_map[vote_id]
-            if report.get("target_user_id") is not None:
                 try:
-                    report["target_user_id"] = int(report.get("target_user_id") or 0) or None
+                    vote_id = int(report.get("vote_id", 0) or 0)
                 except (TypeError, ValueError):
-                    report["target_user_id"] = None
+                    vote_id = 0
+                report["vote_id"] = vote_id
 
-            report.setdefault("created_at", _now_ts())
+                if report.get("target_user_id") is None and vote_id in vote_owner_map:
+                    report["target_user_id"] = vote_owner_map[vote_id]
+                if report.get("target_user_id") is not None:
+                    try:
+                        report["target_user_id"] = int(report.get("target_user_id") or 0) or None
+                    except (TypeError, ValueError):
+                        report["target_user_id"] = None
 
-            if reporter_id is not None and vote_id:
-                pair = (vote_id, reporter_id)
-                if pair in seen_pairs:
-                    continue
-                seen_pairs.add(pair)
+                report.setdefault("created_at", _now_ts())
+
+                if reporter_id is not None and vote_id:
+                    pair = (vote_id, reporter_id)
+                    if pair in seen_pairs:
+                        continue
+                    seen_pairs.add(pair)
 
-            normalised_reports.append(report)
+                normalised_reports.append(report)
 
         if normalised_reports != reports:
             self.store["reports"] = normalised_reports
+        self._reindex_reports()
 
         max_report_id = max(seen_report_ids) if seen_report_ids else 0
         if next_report_id <= max_report_id:
@@ -646,6 +1059,53 @@ class DataStore:
             self.store["next_problem_id"] = self.next_problem_id
 
         # Load category information --------------------------------------
+        if trusted:
+            self._load_course_structure_trusted()
+        else:
+            self._normalise_course_structure()
+        self._category_ids_by_name = {entry["name"]: category_id for category_id, entry in self.course_categories.items()}
+        self._reindex_type_names()
+        self._reindex_course_contests()
+
+        for raw in self.store.get("custom_problems", []):
+            problem = dict(raw)
+            problem.setdefault("meta", {})
+            problem.setdefault("setter", [])
+            problem.setdefault("source", [])
+            problem["is_custom"] = True
+            self._fill_problem_defaults(problem)
+            self.problem_map[problem["id"]] = problem
+            self.custom_problem_ids.add(problem["id"])
+            self._problems_bucket(problem["type"])["problems"][problem["id"]] = problem
+        find_problem = self.problem_map.get
+        for pid, override in self.store.get("problem_overrides", {}).items():
+            if not override:
+                continue
+            problem = find_problem(int(pid))
+            if problem:
+                problem.update(override)
+        self._rebuild_problem_stats()
+        if not trusted:
+            self.store["schema_version"] = STORE_SCHEMA_VERSION
+            self._save_store(
+                "schema_version", "users", "reports", "custom_types",
+                "course_categories", "type_categories", "course_contests",
+            )
+        self._persisted_store = _clone_payload(
+            {key: _storable_segment(key, value) for key, value in self.store.items()}
+        )
+        self._store_mtimes = self._store_file_mtimes()
+
+    def _load_course_structure_trusted(self) -> None:
+        for entry in self.store["course_categories"]:
+            self.course_categories[entry["id"]] = entry
+        for key, category_ids in self.store["type_categories"].items():
+            type_id = int(key)
+            if type_id in self.types:
+                self.type_categories[type_id] = category_ids
+        self._reindex_type_categories()
+
+    def _normalise_course_structure(self) -> None:
         normalised_categories: List[Dict[str, Any]] = []
         max_category_id = 0
         for raw_category in self.store.get("course_categories", []):
@@ -691,6 +1151,7 @@ class DataStore:
                 normalised_type_categories[str(type_id)] = normalised_ids
                 self.type_categories[type_id] = normalised_ids
         self.store["type_categories"] = normalised_type_categories
+        self._reindex_type_categories()
 
         contests_map = {}
         raw_map = self.store.get("course_contests", {}) or {}
@@ -709,31 +1170,42 @@ class DataStore:
             contests_map[key] = bucket
         self.store["course_contests"] = contests_map
 
-        for raw in self.store.get("custom_problems", []):
-            problem = dict(raw)
-            problem.setdefault("meta", {})
-            problem.setdefault("setter", [])
-            problem.setdefault("source", [])
-            problem["is_custom"] = True
-            self._init_problem_stats(problem)
-            self.problem_map[problem["id"]] = problem
-            bucket = self.problems_by_type.setdefault(problem["type"], {"type": self.types.get(problem["type"], {"id": problem["type"], "name": ""}), "problems": []})
-            bucket["problems"].append(problem)
-        for pid, override in self.store.get("problem_overrides", {}).items():
-            problem = self.problem_map.get(int(pid))
-            if problem:
-                problem.update(override)
-        self._rebuild_problem_stats()
-        self._persisted_store = _clone_payload(dict(self.store))
-        self._store_mtime = self._store_file_mtime()
+    def _reindex_users(self) -> None:
+        self._users_by_id = {}
+        self._users_by_username = {}
+        for user in self.store.get("users", []):
+            self._index_user(user)
+
+    def _index_user(self, user: Dict[str, Any]) -> None:
+        self._users_by_id[user["id"]] = user
+        self._users_by_username[user["username"].lower()] = user
+
+    def _reindex_reports(self) -> None:
+        self._reports_by_vote = {}
+        for report in self.store.get("reports", []):
+            self._reports_by_vote.setdefault(report.get("vote_id"), []).append(report)
 
-    def _load_custom_types_from_store(self) -> None:
+    def _load_custom_types_from_store(self, *, trusted: bool = False) -> None:
         previous_custom_ids = set(getattr(self, "custom_types", {}).keys())
         for type_id in previous_custom_ids:
             self.types.pop(type_id, None)
             self.problems_by_type.pop(type_id, None)
         self.custom_types = {}
         existing_type_ids = list(self.types.keys())
+        if trusted:
+            for entry in self.store["custom_types"]:
+                type_id = entry["id"]
+                self.types[type_id] = entry
+                self.custom_types[type_id] = entry
+                self.problems_by_type.setdefault(type_id, {"type": entry, "problems": {}})
+                existing_type_ids.append(type_id)
+        else:
+            self._normalise_custom_types(existing_type_ids)
+        proposed_next_type = max(existing_type_ids or [0]) + 1
+        if self.store.get("next_type_id", 0) < proposed_next_type:
+            self.store["next_type_id"] = proposed_next_type
+
+    def _normalise_custom_types(self, existing_type_ids: List[int]) -> None:
         raw_custom_types = self.store.setdefault("custom_types", []) or []
         normalised_custom_types: List[Dict[str, Any]] = []
         for raw_type in raw_custom_types:
@@ -750,20 +1222,17 @@ class DataStore:
             self.custom_types[type_id] = entry
             self.problems_by_type.setdefault(
                 type_id,
-                {"type": entry, "problems": []},
+                {"type": entry, "problems": {}},
             )
             existing_type_ids.append(type_id)
         self.store["custom_types"] = normalised_custom_types
-        proposed_next_type = max(existing_type_ids or [0]) + 1
-        if self.store.get("next_type_id", 0) < proposed_next_type:
-            self.store["next_type_id"] = proposed_next_type
 
     def _bootstrap_announcements(self) -> None:
         if self.store["announcements"]:
             existing_ids = [item.get("id", 0) for item in self.store["announcements"]]
             self.store.setdefault("next_announcement_id", max(existing_ids, default=0) + 1)
             return
-        seed = self._load_json_file(ANNOUNCEMENTS_SEED_PATH, DEFAULT_ANNOUNCEMENTS_SEED)
+        seed = self._load_json_file(ANNOUNCEMENTS_SEED_PATH, DEFAULT_ANNOUNCEMENTS_SEED, shared=True)
         announcements = []
         for idx, item in enumerate(seed.get("announcements", []), start=1):
             ts = self._parse_time_string(item.get("time"))
@@ -774,28 +1243,44 @@ class DataStore:
                 "pinned": bool(item.get("pinned")),
                 "created_at": ts,
             })
+        if not announcements:
+            # Nothing to seed; only persist the counter if the store lacks one.
+            if "next_announcement_id" not in self.store:
+                self.store["next_announcement_id"] = 1
+                self._save_store("next_announcement_id")
+            return
         self.store["announcements"] = announcements
         self.store["next_announcement_id"] = len(announcements) + 1
+        self._sorted_announcements = None
+        self._newest_announcement_ts = None
         self._save_store()
 
-    def _load_json_file(self, path: Path, default_payload: Any) -> Any:
+    def _load_json_file(self, path: Path, default_payload: Any, *, shared: bool = False) -> Any:
+        """Parse a JSON data file, seeding it with ``default_payload`` when missing or invalid.
+
+        With ``shared=True`` the parsed payload is memoized per file version and the
+        same object is returned to every caller, so it must be treated as read-only.
+        """
+
         path.parent.mkdir(parents=True, exist_ok=True)
+        if shared:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                stat = None
+            if stat is not None:
+                cached = _JSON_CACHE.get(path)
+                if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                    return cached[2]
+                payload = self._load_json_file(path, default_payload)
+                _JSON_CACHE[path] = (stat.st_mtime_ns, stat.st_size, payload)
+                return payload
         try:
-            text = path.read_text(encoding="utf-8")
-        except FileNotFoundError:
-            data = _clone_default(default_payload)
-            path.write_text(json.dumps(default_payload, ensure_ascii=False, indent=2), encoding="utf-8")
-            return data
-        text = text.strip()
-        if not text:
-            data = _clone_default(default_payload)
-            path.write_text(json.dumps(default_payload, ensure_ascii=False, indent=2), encoding="utf-8")
-            return data
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
+            return _read_json_file(path)
+        except (FileNotFoundError, json.JSONDecodeError):
             data = _clone_default(default_payload)
-            path.write_text(json.dumps(default_payload, ensure_ascii=False, indent=2), encoding="utf-8")
+            _write_json_atomic(path, default_payload, indent=True)
+            _fsync_dir(path.parent)
             return data
 
     def _init_problem_stats(self, item: Dict[str, Any], *, reset: bool = False) -> None:
@@ -825,16 +1310,41 @@ class DataStore:
                 item[cnt_key] = count
                 item[avg_key] = avg
                 item[sd_key] = sd
+        self._fill_problem_defaults(item)
+        item["_stats"] = stats
+
+    def _problems_bucket(self, type_id: int) -> Dict[str, Any]:
+        # Only build the placeholder entry when the course has no bucket yet.
+        bucket = self.problems_by_type.get(type_id)
+        if bucket is None:
+            bucket = {"type": self.types.get(type_id, {"id": type_id, "name": ""}), "problems": {}}
+            self.problems_by_type[type_id] = bucket
+        return bucket
+
+    def _fill_problem_defaults(self, item: Dict[str, Any]) -> None:
         item.setdefault("tags", [])
         item.setdefault("knowledge_difficulty", None)
         item.setdefault("meta", {}).setdefault("tags", item.get("tags", []))
         if "knowledge_difficulty" in item and item["knowledge_difficulty"]:
                 item["meta"].setdefault("knowledge_difficulty", item["knowledge_difficulty"])
-        item["_stats"] = stats
+
+    def _problem_stats(self, problem: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+        """Return the running sums for ``problem``, deriving them from its cnt/avg/sd fields on first use."""
+
+        stats = problem.get("_stats")
+        if stats is None:
+            self._init_problem_stats(problem)
+            stats = problem["_stats"]
+        return stats
 
     def _reset_problem_stats(self) -> None:
+        # Running sums are only rebuilt for problems that actually receive votes.
         for problem in self.problem_map.values():
-            self._init_problem_stats(problem, reset=True)
+            problem.pop("_stats", None)
+            for mapping in PROBLEM_STATS_SPECS.values():
+                problem[mapping["cnt"]] = 0
+                problem[mapping["avg"]] = None
+                problem[mapping["sd"]] = None
             problem["median_thinking"] = None
             problem["median_implementation"] = None
             problem["medium_difficulty"] = None
@@ -849,43 +1359,184 @@ class DataStore:
             except (TypeError, ValueError):
                 continue
         for problem_id in sorted(problem_ids):
-            votes = self._get_vote_bucket(problem_id, clone=True)
+            problem = self.problem_map.get(problem_id)
+            if not problem:
+                continue
+            # Read-only pass over the cached bucket: it is not modified here, so no
+            # clone is needed, and the median inputs are gathered alongside the sums.
+            votes = self._get_vote_bucket(problem_id)
             if not votes:
                 continue
+            totals = {metric: [0, 0.0, 0.0] for metric in PROBLEM_STATS_SPECS}
+            thinking_values: List[float] = []
+            implementation_values: List[float] = []
+            overall_values: List[float] = []
+            quality_values: List[float] = []
             for vote in votes:
                 if vote.get("deleted"):
                     continue
-                self._adjust_problem_stats(
-                    problem_id,
-                    thinking=vote.get("thinking"),
-                    implementation=vote.get("implementation"),
-                    overall=vote.get("overall") or vote.get("difficulty"),
-                    quality=vote.get("quality"),
-                    update_median=False,
-                )
-            self._update_problem_medians(problem_id)
+                thinking = vote.get("thinking")
+                implementation = vote.get("implementation")
+                overall = vote.get("overall")
+                quality = vote.get("quality")
+                if thinking is not None:
+                    thinking_values.append(float(thinking))
+                if implementation is not None:
+                    implementation_values.append(float(implementation))
+                if overall is not None:
+                    overall_values.append(float(overall))
+                if quality is not None:
+                    quality_values.append(float(quality))
+                for metric, value in (
+                    ("thinking", thinking),
+                    ("implementation", implementation),
+                    ("overall", overall or vote.get("difficulty")),
+                    ("quality", quality),
+                ):
+                    if value is None:
+                        continue
+                    entry = totals[metric]
+                    entry[0] += 1
+                    entry[1] += value
+                    entry[2] += value * value
+            problem["_stats"] = {
+                metric: {"count": count, "sum": total, "sum_sq": total_sq}
+                for metric, (count, total, total_sq) in totals.items()
+            }
+            self._materialize_problem_stats(problem_id)
+            problem["median_thinking"] = _median(thinking_values)
+            problem["median_implementation"] = _median(implementation_values)
+            problem["medium_difficulty"] = _median(overall_values)
+            problem["medium_quality"] = _median(quality_values)
 
     def _update_problem_medians(self, problem_id: int) -> None:
         problem = self.problem_map.get(problem_id)
         if not problem:
             return
-        votes = [vote for vote in self._get_vote_bucket(problem_id, clone=True) if not vote.get("deleted")]
-        if not votes:
-            problem["median_thinking"] = None
-            problem["median_implementation"] = None
-            problem["medium_difficulty"] = None
-            problem["medium_quality"] = None
-            return
-        thinking_values = [float(v["thinking"]) for v in votes if v.get("thinking") is not None]
-        implementation_values = [float(v["implementation"]) for v in votes if v.get("implementation") is not None]
-        overall_values = [float(v["overall"]) for v in votes if v.get("overall") is not None]
-        quality_values = [float(v["quality"]) for v in votes if v.get("quality") is not None]
+        thinking_values: List[float] = []
+        implementation_values: List[float] = []
+        overall_values: List[float] = []
+        quality_values: List[float] = []
+        # The bucket is this problem's votes only and is just read, so walk it once
+        # in place rather than cloning it and filtering it four times.
+        for vote in self._get_vote_bucket(problem_id):
+            if vote.get("deleted"):
+                continue
+            thinking = vote.get("thinking")
+            implementation = vote.get("implementation")
+            overall = vote.get("overall")
+            quality = vote.get("quality")
+            if thinking is not None:
+                thinking_values.append(float(thinking))
+            if implementation is not None:
+                implementation_values.append(float(implementation))
+            if overall is not None:
+                overall_values.append(float(overall))
+            if quality is not None:
+                quality_values.append(float(quality))
         problem["median_thinking"] = _median(thinking_values)
         problem["median_implementation"] = _median(implementation_values)
         problem["medium_difficulty"] = _median(overall_values)
         problem["medium_quality"] = _median(quality_values)
 
     def _save_store(self, *keys: str) -> None:
+        """Queue the given store keys (or every changed key) to be written.
+
+        Changes to ``STORE_SYNC_KEYS``, and full saves, are flushed before returning
+        (at the end of the batch inside ``batch_writes``); the rest wait for the
+        debounced flush.
+        """
+
+        with self._store_lock:
+            if keys:
+                self._pending_store_keys.update(keys)
+            else:
+                self._pending_full_save = True
+            if self._needs_sync_flush() and not self._batch_depth:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def _needs_sync_flush(self) -> bool:
+        return self._pending_full_save or not STORE_SYNC_KEYS.isdisjoint(self._pending_store_keys)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_timer is None and not self._batch_depth:
+            timer = Timer(STORE_FLUSH_DELAY, self._flush_on_timer)
+            timer.daemon = True
+            self._flush_timer = timer
+            timer.start()
+
+    def _flush_on_timer(self) -> None:
+        with self._store_lock:
+            if self._batch_depth:
+                # A batch opened after this timer was armed; its exit schedules the flush.
+                self._flush_timer = None
+                return
+            self.flush()
+
+    @contextmanager
+    def batch_writes(self) -> Iterator[None]:
+        """Hold back every flush, immediate or debounced, until the outermost block exits.
+
+        Wrap several mutations in this so they reach disk in one flush, never halfway.
+        """
+
+        with self._store_lock:
+            if not self._batch_depth:
+                # Checks inside the batch are skipped, so start it from the files' current state.
+                self._ensure_store_fresh(force=True)
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._store_lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    if self._needs_sync_flush():
+                        self.flush()
+                    elif self._pending_store_keys or self._pending_vote_buckets:
+                        self._schedule_flush()
+
+    def flush(self) -> None:
+        """Write pending store changes to disk now.
+
+        Each touched segment or vote bucket is written to a temp file, fsynced once
+        and renamed into place, however many mutations it batched; the containing
+        directories are then synced once so the renames survive a crash. Registered with
+        ``atexit``; call it directly when a write must be visible immediately.
+        """
+
+        with self._store_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._write_pending_vote_buckets()
+            if not self._pending_full_save and not self._pending_store_keys:
+                return
+            keys = () if self._pending_full_save else tuple(self._pending_store_keys)
+            self._pending_full_save = False
+            self._pending_store_keys = set()
+            self._write_store(*keys)
+            _fsync_dir(STORE_DIR)
+
+    def _write_pending_vote_buckets(self) -> None:
+        vote_buckets = self._pending_vote_buckets
+        if not vote_buckets:
+            return
+        self._pending_vote_buckets = set()
+        # Only take the directory's new mtime as seen if no other process had changed
+        # it since the last check; otherwise that change would never be reloaded.
+        unchanged = self._store_mtimes.get(VOTES_DIR_MTIME_KEY) == self._compute_votes_dir_mtime()
+        for problem_id in sorted(vote_buckets):
+            self._write_vote_bucket(problem_id)
+        # One directory sync covers every bucket renamed in this flush.
+        _fsync_dir(self._votes_dir)
+        self._votes_dir_mtime = self._compute_votes_dir_mtime()
+        if unchanged:
+            self._store_mtimes[VOTES_DIR_MTIME_KEY] = self._votes_dir_mtime
+
+    def _write_store(self, *keys: str) -> None:
         existing_files = []
         if STORE_DIR.exists():
             existing_files = [path for path in STORE_DIR.glob("*.json") if path.is_file()]
@@ -895,13 +1546,10 @@ class DataStore:
         if keys:
             target_keys: Set[str] = {key for key in keys if key != "votes" and (key in self.store or key in self._persisted_store)}
         else:
-            target_keys = {
-                key for key, value in self.store.items()
-                if key != "votes" and (key not in self._persisted_store or value != self._persisted_store[key])
-            }
-            target_keys.update({key for key in self._persisted_store.keys() if key != "votes" and key not in self.store})
+            target_keys = self._changed_store_keys()
         if initializing:
             target_keys = set(self.store.keys()) | target_keys
+            self._store_mtimes.pop(LEGACY_STORE_PATH.name, None)
         target_keys.discard("votes")
 
         if not target_keys:
@@ -910,15 +1558,19 @@ class DataStore:
         for key in target_keys:
             path = STORE_DIR / f"{key}.json"
             if key in self.store:
-                payload = self.store[key]
-                path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+                payload = _storable_segment(key, self.store[key])
+                _write_json_atomic(path, payload, indent=STORE_PRETTY_JSON)
                 self._persisted_store[key] = _clone_payload(payload)
+                # Record only the files written here, so other segments changed by
+                # another process meanwhile still read as changed.
+                self._store_mtimes[path.name] = path.stat().st_mtime
             else:
                 try:
                     path.unlink()
                 except FileNotFoundError:
                     pass
                 self._persisted_store.pop(key, None)
+                self._store_mtimes.pop(path.name, None)
 
         legacy_path = LEGACY_STORE_PATH
         if legacy_path.exists() and initializing:
@@ -930,50 +1582,83 @@ class DataStore:
             except OSError:
                 pass
 
-        self._store_mtime = self._store_file_mtime()
+    def _changed_store_keys(self) -> Set[str]:
+        """Store keys whose in-memory value differs from what was last read or written."""
+
+        changed = {
+            key for key, value in self.store.items()
+            if key != "votes"
+            and (key not in self._persisted_store or _storable_segment(key, value) != self._persisted_store[key])
+        }
+        changed.update(key for key in self._persisted_store.keys() if key != "votes" and key not in self.store)
+        return changed
+
+    def _store_file_mtimes(self) -> Dict[str, float]:
+        """Modification times of the store files, keyed by file name.
+
+        Segments are few and may be edited in place by hand, so each is checked; vote
+        buckets are only replaced by rename, so the votes directory's mtime covers them.
+        """
 
-    def _store_file_mtime(self) -> float:
-        latest = 0.0
+        mtimes: Dict[str, float] = {}
         if STORE_DIR.exists():
             for path in STORE_DIR.glob("*.json"):
                 try:
-                    mtime = path.stat().st_mtime
+                    mtimes[path.name] = path.stat().st_mtime
                 except FileNotFoundError:
                     continue
-                if mtime > latest:
-                    latest = mtime
-            if VOTES_DIR.exists():
-                for path in VOTES_DIR.glob("*.json"):
-                    try:
-                        mtime = path.stat().st_mtime
-                    except FileNotFoundError:
-                        continue
-                    if mtime > latest:
-                        latest = mtime
-                try:
-                    dir_mtime = VOTES_DIR.stat().st_mtime
-                    if dir_mtime > latest:
-                        latest = dir_mtime
-                except FileNotFoundError:
-                    pass
+        if mtimes:
+            mtimes[VOTES_DIR_MTIME_KEY] = self._compute_votes_dir_mtime()
+        else:
             try:
-                legacy_votes_mtime = LEGACY_VOTES_PATH.stat().st_mtime
-                if legacy_votes_mtime > latest:
-                    latest = legacy_votes_mtime
+                mtimes[LEGACY_STORE_PATH.name] = LEGACY_STORE_PATH.stat().st_mtime
             except FileNotFoundError:
                 pass
-        if latest:
-            return latest
-        try:
-            return LEGACY_STORE_PATH.stat().st_mtime
-        except FileNotFoundError:
-            return 0.0
+        return mtimes
+
+    def _ensure_store_fresh(self, *, force: bool = False) -> None:
+        """Reload the store if its files changed since they were last read or written.
+
+        Reads skip the check for ``STORE_CHECK_INTERVAL`` after the last one. Mutators
+        pass ``force=True`` from inside the store lock: they allocate ids and write
+        whole segments, so they must start from what is on disk now.
+        """
+
+        now = time.monotonic()
+        if not force and now - self._last_fresh_check < STORE_CHECK_INTERVAL:
+            return
+        # Hold the store lock so a flush running on the timer thread cannot be
+        # mistaken for another process rewriting the files halfway through.
+        with self._store_lock:
+            if self._batch_depth:
+                # Let a batch finish its related changes against one view of the store.
+                return
+            self._last_fresh_check = now
+            if self._store_file_mtimes() == self._store_mtimes:
+                return
+            if self._flush_timer is None:
+                # Re-load store data when another process updates the backing files.
+                self._load_store()
+            else:
+                self._reload_keeping_local_changes()
+
+    def _reload_keeping_local_changes(self) -> None:
+        """Pick up another process's writes while this one still has unflushed changes.
+
+        Pending vote buckets are written first so the reload reads them back. Segments
+        changed here are carried over into the reload and stay queued for the pending
+        flush; every other segment is taken from disk.
+        """
 
-    def _ensure_store_fresh(self) -> None:
-        current_mtime = self._store_file_mtime()
-        if current_mtime and current_mtime > getattr(self, "_store_mtime", 0.0):
-            # Re-load store data when another process updates the backing file.
-            self._load_store()
+        self._pending_vote_buckets.update(self._votes_dirty)
+        self._write_pending_vote_buckets()
+        if self._pending_full_save:
+            local_keys = self._changed_store_keys()
+        else:
+            local_keys = set(self._pending_store_keys)
+        self._load_store({key: self.store[key] for key in local_keys if key in self.store})
+        self._pending_full_save = False
+        self._pending_store_keys.update(local_keys)
 
     def _normalise_course_id(self, value: Any) -> Optional[int]:
         if value is None or value == "":
@@ -988,7 +1673,17 @@ class DataStore:
         if not value:
             return _now_ts()
         try:
-            return int(datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp())
+            # Fast path for the canonical "YYYY-MM-DD HH:MM:SS" shape; strptime re-parses
+            # its format string on every call.
+            digits = value[0:4] + value[5:7] + value[8:10] + value[11:13] + value[14:16] + value[17:19]
+            if len(value) == 19 and value[4:17:3] == "-- ::" and digits.isascii() and digits.isdigit():
+                parsed = datetime(
+                    int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                    int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                )
+            else:
+                parsed = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+            return int(parsed.timestamp())
         except ValueError:
             return _now_ts()
 
@@ -996,20 +1691,23 @@ class DataStore:
 
     def list_types(self) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
-        return sorted(self.types.values(), key=lambda item: item["id"])
+        if self._sorted_types is None:
+            self._sorted_types = sorted(self.types.values(), key=lambda item: item["id"])
+        return list(self._sorted_types)
 
     def list_type_groups(self) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
+        if self._type_groups is None:
+            self._type_groups = self._build_type_groups()
+        return list(self._type_groups)
+
+    def _build_type_groups(self) -> List[Dict[str, Any]]:
         groups = [{"label": group["label"], "entries": list(group["entries"])} for group in self.type_groups]
         if self.course_categories:
             for category_id in sorted(self.course_categories):
                 category = self.course_categories[category_id]
-                entries = []
-                seen = set()
-                for type_id, assigned_ids in self.type_categories.items():
-                    if category_id in assigned_ids and type_id in self.types and type_id not in seen:
-                        seen.add(type_id)
-                        entries.append(self.types[type_id])
+                type_ids = self._category_to_types.get(category_id, ())
+                entries = [self.types[type_id] for type_id in type_ids if type_id in self.types]
                 if entries:
                     entries.sort(key=lambda item: item["name"])
                     groups.append({"label": category["name"], "entries": entries})
@@ -1020,8 +1718,7 @@ class DataStore:
 
     def list_course_contests(self, type_id: int) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
-        contests = self.store.get("course_contests", {}).get(str(type_id), [])
-        return list(contests)
+        return list(self.course_contests.get(type_id, ()))
 
     def get_first_course_id(self) -> Optional[int]:
         self._ensure_store_fresh()
@@ -1033,16 +1730,17 @@ class DataStore:
         return default_id
 
     def set_global_default_course(self, course_id: Optional[int]) -> None:
-        self._ensure_store_fresh()
-        if course_id is None:
-            self.store["global_default_course_id"] = None
-            self._save_store()
-            return
-        normalised = self._normalise_course_id(course_id)
-        if normalised is None:
-            raise ValueError("课程不存在")
-        self.store["global_default_course_id"] = normalised
-        self._save_store()
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            if course_id is None:
+                self.store["global_default_course_id"] = None
+                self._save_store("global_default_course_id")
+                return
+            normalised = self._normalise_course_id(course_id)
+            if normalised is None:
+                raise ValueError("课程不存在")
+            self.store["global_default_course_id"] = normalised
+            self._save_store("global_default_course_id")
 
     def resolve_start_course_id(self, user: Optional[Dict[str, Any]] = None) -> Optional[int]:
         self._ensure_store_fresh()
@@ -1057,7 +1755,9 @@ class DataStore:
 
     def list_categories(self) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
-        return sorted(self.course_categories.values(), key=lambda item: item["id"])
+        if self._sorted_categories is None:
+            self._sorted_categories = sorted(self.course_categories.values(), key=lambda item: item["id"])
+        return list(self._sorted_categories)
 
     def get_categories_for_course(self, type_id: int) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
@@ -1067,6 +1767,27 @@ class DataStore:
         self._ensure_store_fresh()
         return list(self.type_categories.get(type_id, []))
 
+    def _reindex_type_names(self) -> None:
+        self._sorted_types = None
+        self._type_groups = None
+        self._type_ids_by_name = {entry["name"]: type_id for type_id, entry in self.types.items()}
+
+    def _reindex_course_contests(self) -> None:
+        self.course_contests = {}
+        for key, contests in self.store["course_contests"].items():
+            try:
+                self.course_contests[int(key)] = contests
+            except (TypeError, ValueError):
+                continue
+
+    def _reindex_type_categories(self) -> None:
+        reverse: Dict[int, List[int]] = {}
+        for type_id, category_ids in self.type_categories.items():
+            for category_id in category_ids:
+                reverse.setdefault(category_id, []).append(type_id)
+        self._category_to_types = reverse
+        self._type_groups = None
+
     def _normalise_category_ids(self, category_ids: Optional[Iterable[Any]]) -> List[int]:
         if not category_ids:
             return []
@@ -1083,182 +1804,197 @@ class DataStore:
             normalised.append(category_id)
         return normalised
 
-    def _set_course_categories(self, type_id: int, category_ids: Optional[Iterable[Any]], *, save: bool) -> None:
+    def _set_course_categories(self, type_id: int, category_ids: Optional[Iterable[Any]], *, save: bool) -> bool:
+        """Assign categories to a course; returns whether the assignment changed."""
+
         if type_id not in self.types:
             raise ValueError("课程不存在")
         normalised = self._normalise_category_ids(category_ids)
         mapping = self.store.setdefault("type_categories", {})
         key = str(type_id)
-        changed = False
         if normalised:
-            changed = mapping.get(key) != normalised
+            if mapping.get(key) == normalised:
+                return False
             mapping[key] = normalised
             self.type_categories[type_id] = normalised
         else:
-            if key in mapping:
-                mapping.pop(key, None)
-                changed = True
-            if type_id in self.type_categories:
-                self.type_categories.pop(type_id, None)
-                changed = True
-        if changed and save:
-            self._save_store()
+            if key not in mapping and type_id not in self.type_categories:
+                return False
+            mapping.pop(key, None)
+            self.type_categories.pop(type_id, None)
+        self._reindex_type_categories()
+        if save:
+            self._save_store("type_categories")
+        return True
 
     def set_course_categories(self, type_id: int, category_ids: Iterable[Any]) -> None:
-        self._ensure_store_fresh()
-        self._set_course_categories(type_id, category_ids, save=True)
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            self._set_course_categories(type_id, category_ids, save=True)
 
     def create_category(self, name: str) -> Dict[str, Any]:
-        self._ensure_store_fresh()
-        title = name.strip()
-        if not title:
-            raise ValueError("分类名称不能为空")
-        if any(entry["name"] == title for entry in self.course_categories.values()):
-            raise ValueError("分类已存在")
-        category_id = self.store["next_category_id"]
-        self.store["next_category_id"] += 1
-        entry = {"id": category_id, "name": title}
-        categories = self.store.setdefault("course_categories", [])
-        categories.append(entry)
-        categories.sort(key=lambda item: item["id"])
-        self.course_categories[category_id] = entry
-        self._save_store()
-        return entry
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            title = name.strip()
+            if not title:
+                raise ValueError("分类名称不能为空")
+            if title in self._category_ids_by_name:
+                raise ValueError("分类已存在")
+            category_id = self.store["next_category_id"]
+            self.store["next_category_id"] += 1
+            entry = {"id": category_id, "name": title}
+            categories = self.store.setdefault("course_categories", [])
+            categories.append(entry)
+            categories.sort(key=lambda item: item["id"])
+            self.course_categories[category_id] = entry
+            self._category_ids_by_name[title] = category_id
+            self._sorted_categories = None
+            self._save_store("course_categories", "next_category_id")
+            return entry
 
     def delete_category(self, category_id: int) -> bool:
-        self._ensure_store_fresh()
-        if category_id not in self.course_categories:
-            return False
-        self.store["course_categories"] = [
-            item for item in self.store.get("course_categories", []) if int(item.get("id", 0) or 0) != category_id
-        ]
-        self.course_categories.pop(category_id, None)
-        mapping = self.store.setdefault("type_categories", {})
-        for key in list(mapping.keys()):
-            try:
-                type_id = int(key)
-            except (TypeError, ValueError):
-                mapping.pop(key, None)
-                continue
-            filtered: List[int] = []
-            for raw_category_id in mapping.get(key, []):
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            if category_id not in self.course_categories:
+                return False
+            _pop_by_id(self.store.setdefault("course_categories", []), category_id)
+            entry = self.course_categories.pop(category_id)
+            self._sorted_categories = None
+            if self._category_ids_by_name.get(entry["name"]) == category_id:
+                self._category_ids_by_name.pop(entry["name"], None)
+            mapping = self.store.setdefault("type_categories", {})
+            for key in list(mapping.keys()):
                 try:
-                    cid = int(raw_category_id)
+                    type_id = int(key)
                 except (TypeError, ValueError):
+                    mapping.pop(key, None)
                     continue
-                if cid == category_id:
-                    continue
-                filtered.append(cid)
-            if filtered:
-                mapping[key] = filtered
-                self.type_categories[type_id] = filtered
-            else:
-                mapping.pop(key, None)
-                self.type_categories.pop(type_id, None)
-        for type_id, ids in list(self.type_categories.items()):
-            if category_id in ids:
-                filtered_ids = [cid for cid in ids if cid != category_id]
-                if filtered_ids:
-                    self.type_categories[type_id] = filtered_ids
+                filtered: List[int] = []
+                for raw_category_id in mapping.get(key, []):
+                    try:
+                        cid = int(raw_category_id)
+                    except (TypeError, ValueError):
+                        continue
+                    if cid == category_id:
+                        continue
+                    filtered.append(cid)
+                if filtered:
+                    mapping[key] = filtered
+                    self.type_categories[type_id] = filtered
                 else:
+                    mapping.pop(key, None)
                     self.type_categories.pop(type_id, None)
-        self._save_store()
-        return True
+            for type_id, ids in list(self.type_categories.items()):
+                if category_id in ids:
+                    filtered_ids = [cid for cid in ids if cid != category_id]
+                    if filtered_ids:
+                        self.type_categories[type_id] = filtered_ids
+                    else:
+                        self.type_categories.pop(type_id, None)
+            self._reindex_type_categories()
+            self._save_store("course_categories", "type_categories")
+            return True
 
     def create_course(self, name: str, category_ids: Optional[Iterable[Any]] = None) -> Dict[str, Any]:
-        self._ensure_store_fresh()
-        title = name.strip()
-        if not title:
-            raise ValueError("课程名称不能为空")
-        for item in self.types.values():
-            if item["name"] == title:
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            title = name.strip()
+            if not title:
+                raise ValueError("课程名称不能为空")
+            if title in self._type_ids_by_name:
                 raise ValueError("课程已存在")
-        type_id = self.store["next_type_id"]
-        self.store["next_type_id"] += 1
-        entry = {"id": type_id, "name": title}
-        self.custom_types[type_id] = entry
-        self.types[type_id] = entry
-        self.store.setdefault("custom_types", []).append(entry)
-        self.problems_by_type[type_id] = {"type": entry, "problems": []}
-        self.store.setdefault("course_contests", {}).setdefault(str(type_id), [])
-        self._set_course_categories(type_id, category_ids, save=False)
-        self._save_store()
-        return entry
+            type_id = self.store["next_type_id"]
+            self.store["next_type_id"] += 1
+            entry = {"id": type_id, "name": title}
+            self.custom_types[type_id] = entry
+            self.types[type_id] = entry
+            self._type_ids_by_name[title] = type_id
+            self._sorted_types = None
+            self._type_groups = None
+            self.store.setdefault("custom_types", []).append(entry)
+            self.problems_by_type[type_id] = {"type": entry, "problems": {}}
+            self.course_contests[type_id] = self.store["course_contests"].setdefault(str(type_id), [])
+            self._set_course_categories(type_id, category_ids, save=False)
+            self._save_store("custom_types", "next_type_id", "course_contests", "type_categories")
+            return entry
 
     def delete_course(self, type_id: int) -> bool:
-        self._ensure_store_fresh()
-        if type_id not in self.custom_types:
-            return False
-        bucket = self.problems_by_type.get(type_id, {})
-        cleanup_happened = False
-        for problem in list(bucket.get("problems", [])):
-            if self._delete_problem(problem["id"], require_custom=False, save=False):
-                cleanup_happened = True
-        if str(type_id) in self.store.get("course_contests", {}):
-            contests = self.store.get("course_contests", {})
-            if contests.pop(str(type_id), None) is not None:
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            if type_id not in self.custom_types:
+                return False
+            bucket = self.problems_by_type.get(type_id, {})
+            cleanup_happened = False
+            for problem in list(bucket.get("problems", {}).values()):
+                if self._delete_problem(problem["id"], require_custom=False, save=False):
+                    cleanup_happened = True
+            if self.course_contests.pop(type_id, None) is not None:
+                self.store["course_contests"].pop(str(type_id), None)
                 cleanup_happened = True
-        self.store["custom_types"] = [item for item in self.store.get("custom_types", []) if item["id"] != type_id]
-        self._set_course_categories(type_id, [], save=False)
-        self.types.pop(type_id, None)
-        self.custom_types.pop(type_id, None)
-        self.problems_by_type.pop(type_id, None)
-        cleanup_happened = True
-        if cleanup_happened:
-            if self.store.get("global_default_course_id") == type_id:
-                self.store["global_default_course_id"] = None
-            for user in self.store.get("users", []):
-                if user.get("default_course_id") == type_id:
-                    user["default_course_id"] = None
-            self._save_store()
-        return True
+            self.store["custom_types"] = [item for item in self.store.get("custom_types", []) if item["id"] != type_id]
+            self._set_course_categories(type_id, [], save=False)
+            self.types.pop(type_id, None)
+            self.custom_types.pop(type_id, None)
+            self._reindex_type_names()
+            self.problems_by_type.pop(type_id, None)
+            cleanup_happened = True
+            if cleanup_happened:
+                if self.store.get("global_default_course_id") == type_id:
+                    self.store["global_default_course_id"] = None
+                for user in self.store.get("users", []):
+                    if user.get("default_course_id") == type_id:
+                        user["default_course_id"] = None
+                self._save_store()
+            return True
 
     def create_contest(self, type_id: int, name: str) -> Dict[str, Any]:
-        self._ensure_store_fresh()
-        if type_id not in self.types:
-            raise ValueError("课程不存在")
-        title = name.strip()
-        if not title:
-            raise ValueError("比赛名称不能为空")
-        contests_map = self.store.setdefault("course_contests", {})
-        bucket = contests_map.setdefault(str(type_id), [])
-        if any(contest["name"] == title for contest in bucket):
-            raise ValueError("比赛已存在")
-        contest_id = self.store["next_contest_id"]
-        self.store["next_contest_id"] += 1
-        entry = {"id": contest_id, "name": title}
-        bucket.append(entry)
-        self._save_store()
-        return entry
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            if type_id not in self.types:
+                raise ValueError("课程不存在")
+            title = name.strip()
+            if not title:
+                raise ValueError("比赛名称不能为空")
+            bucket = self.course_contests.get(type_id)
+            if bucket is None:
+                bucket = self.course_contests[type_id] = self.store["course_contests"].setdefault(str(type_id), [])
+            if any(contest["name"] == title for contest in bucket):
+                raise ValueError("比赛已存在")
+            contest_id = self.store["next_contest_id"]
+            self.store["next_contest_id"] += 1
+            entry = {"id": contest_id, "name": title}
+            bucket.append(entry)
+            self._save_store("course_contests", "next_contest_id")
+            return entry
 
     def delete_contest(self, type_id: int, contest_id: int) -> bool:
-        self._ensure_store_fresh()
-        contests_map = self.store.setdefault("course_contests", {})
-        bucket = contests_map.get(str(type_id))
-        if not bucket:
-            return False
-        target = None
-        remaining: List[Dict[str, Any]] = []
-        for contest in bucket:
-            if contest.get("id") == contest_id:
-                target = contest
-            else:
-                remaining.append(contest)
-        if not target:
-            return False
-        contests_map[str(type_id)] = remaining
-        contest_name = target.get("name", "")
-        if contest_name:
-            custom_ids = {problem["id"] for problem in self.store.get("custom_problems", [])}
-            for problem in list(self.problems_by_type.get(type_id, {}).get("problems", [])):
-                if problem["id"] in custom_ids and problem.get("contest") == contest_name:
-                    self._delete_problem(problem["id"], require_custom=False, save=False)
-        self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            bucket = self.course_contests.get(type_id)
+            if not bucket:
+                return False
+            target = _pop_by_id(bucket, contest_id)
+            if not target:
+                return False
+            contest_name = target.get("name", "")
+            if contest_name:
+                custom_ids = self.custom_problem_ids
+                for problem in list(self.problems_by_type.get(type_id, {}).get("problems", {}).values()):
+                    if problem["id"] in custom_ids and problem.get("contest") == contest_name:
+                        self._delete_problem(problem["id"], require_custom=False, save=False)
+            self._save_store("course_contests", "custom_problems", "problem_overrides")
+            return True
 
     def get_type_payload(self, type_id: int) -> Optional[Dict[str, Any]]:
         self._ensure_store_fresh()
-        return self.problems_by_type.get(type_id)
+        bucket = self.problems_by_type.get(type_id)
+        if bucket is None:
+            return None
+        # The cached list is shared between callers; they may update the problems but not the list.
+        problems = self._type_problem_lists.get(type_id)
+        if problems is None:
+            problems = self._type_problem_lists[type_id] = list(bucket["problems"].values())
+        return {"type": bucket["type"], "problems": problems}
 
     def get_problem(self, problem_id: int) -> Optional[Dict[str, Any]]:
         self._ensure_store_fresh()
@@ -1268,83 +2004,116 @@ class DataStore:
 
     def newest_announcement_ts(self) -> int:
         self._ensure_store_fresh()
-        if not self.store["announcements"]:
-            return 0
-        return max(item["created_at"] for item in self.store["announcements"])
+        if self._newest_announcement_ts is None:
+            with self._store_lock:
+                self._newest_announcement_ts = max(
+                    (item["created_at"] for item in self.store["announcements"]), default=0
+                )
+        return self._newest_announcement_ts
 
     def list_announcements(self) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
-        items = sorted(self.store["announcements"], key=lambda x: (-int(x.get("pinned", 0)), -x["created_at"]))
-        return items
+        with self._store_lock:
+            # Built under the lock so a concurrent create_announcement cannot slip between
+            # the sort and the cache assignment.
+            if self._sorted_announcements is None:
+                self._sorted_announcements = sorted(self.store["announcements"], key=_announcement_sort_key)
+                self._announcement_sort_keys = [_announcement_sort_key(item) for item in self._sorted_announcements]
+            return list(self._sorted_announcements)
 
     def create_announcement(self, title: str, content: str, pinned: bool) -> None:
-        self._ensure_store_fresh()
-        announcement = {
-            "id": self.store["next_announcement_id"],
-            "title": title,
-            "content": content,
-            "pinned": pinned,
-            "created_at": _now_ts(),
-        }
-        self.store["next_announcement_id"] += 1
-        self.store["announcements"].append(announcement)
-        self._save_store()
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            announcement = {
+                "id": self.store["next_announcement_id"],
+                "title": title,
+                "content": content,
+                "pinned": pinned,
+                "created_at": _now_ts(),
+            }
+            self.store["next_announcement_id"] += 1
+            self.store["announcements"].append(announcement)
+            if self._sorted_announcements is not None:
+                # Slot the new entry into the cached order instead of re-sorting on the next read.
+                key = _announcement_sort_key(announcement)
+                index = bisect.bisect_right(self._announcement_sort_keys, key)
+                self._announcement_sort_keys.insert(index, key)
+                self._sorted_announcements.insert(index, announcement)
+            if self._newest_announcement_ts is not None:
+                self._newest_announcement_ts = max(self._newest_announcement_ts, announcement["created_at"])
+            self._save_store("announcements", "next_announcement_id")
 
     def delete_announcement(self, announcement_id: int) -> bool:
-        self._ensure_store_fresh()
-        before = len(self.store["announcements"])
-        self.store["announcements"] = [a for a in self.store["announcements"] if a["id"] != announcement_id]
-        if len(self.store["announcements"]) != before:
-            self._save_store()
-            return True
-        return False
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            if _pop_by_id(self.store["announcements"], announcement_id) is not None:
+                self._sorted_announcements = None
+                self._newest_announcement_ts = None
+                self._save_store("announcements")
+                return True
+            return False
 
     # User operations ---------------------------------------------------
 
     def find_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         self._ensure_store_fresh()
-        username_lower = username.lower()
-        for user in self.store.get("users", []):
-            if user["username"].lower() == username_lower:
-                return user
-        return None
+        return self._users_by_username.get(username.lower())
 
     def find_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
         self._ensure_store_fresh()
-        for user in self.store.get("users", []):
-            if user["id"] == user_id:
-                return user
-        return None
+        return self._users_by_id.get(user_id)
+
+    def find_users_bulk(self, user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        self._ensure_store_fresh()
+        users: Dict[int, Dict[str, Any]] = {}
+        for user_id in user_ids:
+            user = self._users_by_id.get(user_id)
+            if user is not None:
+                users[user_id] = user
+        return users
 
     def register_user(self, username: str, password: str, luoguid: str, info: str) -> Dict[str, Any]:
         self._ensure_store_fresh()
         if self.find_user_by_username(username):
             raise ValueError("用户名已存在")
-        user = {
-            "id": self.store["next_user_id"],
-            "username": username,
-            "password_hash": generate_password_hash(password),
-            "legacy_password_hash": None,
-            "is_admin": False,
-            "luoguid": luoguid,
-            "info": info,
-            "created_at": _now_ts(),
-            "approved": False,
-            "banned": False,
-            "roles": [],
-            "tag_permissions": [],
-            "default_course_id": None,
-        }
-        self.store["next_user_id"] += 1
-        self.store.setdefault("users", []).append(user)
-        self._save_store()
-        return user
+        # Hash before taking the lock; this is by far the slowest step.
+        password_hash = _hash_password(password)
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            # Checked again under the lock: a concurrent registration may have taken the name.
+            if self.find_user_by_username(username):
+                raise ValueError("用户名已存在")
+            user = {
+                "id": self.store["next_user_id"],
+                "username": username,
+                "password_hash": password_hash,
+                "legacy_password_hash": None,
+                "is_admin": False,
+                "luoguid": luoguid,
+                "info": info,
+                "created_at": _now_ts(),
+                "approved": False,
+                "banned": False,
+                "roles": [],
+                "tag_permissions": [],
+                "default_course_id": None,
+            }
+            _refresh_user_status(user)
+            self.store["next_user_id"] += 1
+            self.store.setdefault("users", []).append(user)
+            self._index_user(user)
+            self._save_store("users", "next_user_id")
+            return user
 
     def update_password(self, user: Dict[str, Any], password: str) -> None:
-        self._ensure_store_fresh()
-        user["password_hash"] = generate_password_hash(password)
-        user["legacy_password_hash"] = None
-        self._save_store()
+        password_hash = _hash_password(password)
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            # A reload replaces the user records; update the one the store holds now.
+            user = self._users_by_id.get(user.get("id"), user)
+            user["password_hash"] = password_hash
+            user["legacy_password_hash"] = None
+            self._save_store("users")
 
     def verify_user_password(self, user: Dict[str, Any], password: str) -> bool:
         self._ensure_store_fresh()
@@ -1354,6 +2123,8 @@ class DataStore:
         if password_hash:
             try:
                 if check_password_hash(password_hash, password):
+                    if _password_needs_rehash(password_hash):
+                        self.update_password(user, password)
                     return True
             except ValueError:
                 pass
@@ -1364,98 +2135,115 @@ class DataStore:
         return False
 
     def approve_user(self, user_id: int) -> bool:
-        self._ensure_store_fresh()
-        user = self.find_user_by_id(user_id)
-        if not user:
-            return False
-        user["approved"] = True
-        self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self.find_user_by_id(user_id)
+            if not user:
+                return False
+            user["approved"] = True
+            _refresh_user_status(user)
+            self._save_store("users")
+            return True
 
     def reject_user(self, user_id: int) -> bool:
-        self._ensure_store_fresh()
-        users = self.store.get("users", [])
-        before = len(users)
-        self.store["users"] = [user for user in users if user["id"] != user_id]
-        if len(self.store["users"]) != before:
-            self._save_store()
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self._users_by_id.pop(user_id, None)
+            if user is None:
+                return False
+            self._users_by_username.pop(user["username"].lower(), None)
+            _pop_by_id(self.store.setdefault("users", []), user_id)
+            self._save_store("users")
             return True
-        return False
 
     def set_admin(self, user_id: int, is_admin: bool) -> bool:
-        self._ensure_store_fresh()
-        user = self.find_user_by_id(user_id)
-        if not user:
-            return False
-        user["is_admin"] = is_admin
-        roles = set(user.get("roles", []))
-        if is_admin:
-            roles.add("admin")
-        else:
-            roles.discard("admin")
-        user["roles"] = sorted(roles)
-        self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self.find_user_by_id(user_id)
+            if not user:
+                return False
+            user["is_admin"] = is_admin
+            roles = set(user.get("roles", []))
+            if is_admin:
+                roles.add("admin")
+            else:
+                roles.discard("admin")
+            user["roles"] = sorted(roles)
+            _refresh_user_status(user)
+            self._save_store("users")
+            return True
 
     def set_banned(self, user_id: int, banned: bool) -> bool:
-        self._ensure_store_fresh()
-        user = self.find_user_by_id(user_id)
-        if not user:
-            return False
-        user["banned"] = banned
-        self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self.find_user_by_id(user_id)
+            if not user:
+                return False
+            user["banned"] = banned
+            _refresh_user_status(user)
+            self._save_store("users")
+            return True
 
     def add_tag_permission(self, user_id: int, permission: str, *, save: bool = True) -> bool:
-        self._ensure_store_fresh()
-        user = self.find_user_by_id(user_id)
-        if not user:
-            return False
-        perm = permission.strip()
-        if not perm:
-            raise ValueError("标签权限不能为空")
-        perms = user.setdefault("tag_permissions", [])
-        if perm in perms:
-            return False
-        perms.append(perm)
-        if save:
-            self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self.find_user_by_id(user_id)
+            if not user:
+                return False
+            perm = permission.strip()
+            if not perm:
+                raise ValueError("标签权限不能为空")
+            perms = user.setdefault("tag_permissions", [])
+            if perm in perms:
+                return False
+            perms.append(perm)
+            if save:
+                self._save_store("users")
+            return True
 
     def remove_tag_permission(self, user_id: int, permission: str, *, save: bool = True) -> bool:
-        self._ensure_store_fresh()
-        user = self.find_user_by_id(user_id)
-        if not user:
-            return False
-        perm = permission.strip()
-        perms = user.setdefault("tag_permissions", [])
-        if perm not in perms:
-            return False
-        user["tag_permissions"] = [p for p in perms if p != perm]
-        if save:
-            self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self.find_user_by_id(user_id)
+            if not user:
+                return False
+            perm = permission.strip()
+            perms = user.setdefault("tag_permissions", [])
+            if perm not in perms:
+                return False
+            user["tag_permissions"] = [p for p in perms if p != perm]
+            if save:
+                self._save_store("users")
+            return True
 
     def set_user_default_course(self, user_id: int, course_id: Optional[int]) -> bool:
-        self._ensure_store_fresh()
-        user = self.find_user_by_id(user_id)
-        if not user:
-            return False
-        if course_id is None or course_id == "":
-            user["default_course_id"] = None
-            self._save_store()
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            user = self.find_user_by_id(user_id)
+            if not user:
+                return False
+            if course_id is None or course_id == "":
+                user["default_course_id"] = None
+                self._save_store("users")
+                return True
+            normalised = self._normalise_course_id(course_id)
+            if normalised is None:
+                raise ValueError("课程不存在")
+            user["default_course_id"] = normalised
+            self._save_store("users")
             return True
-        normalised = self._normalise_course_id(course_id)
-        if normalised is None:
-            raise ValueError("课程不存在")
-        user["default_course_id"] = normalised
-        self._save_store()
-        return True
 
     def clear_votes_for_user(self, user_id: int) -> int:
-        self._ensure_store_fresh()
-        cleared, _ = self._remove_votes_matching(lambda vote: vote.get("user_id") == user_id)
-        return cleared
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            problem_ids = self._vote_problems_by_user.get(user_id)
+            if not problem_ids:
+                return 0
+            cleared, _ = self._remove_votes_matching(
+                lambda vote: vote.get("user_id") == user_id,
+                problem_ids=set(problem_ids),
+            )
+            return cleared
 
     # Vote operations ---------------------------------------------------
 
@@ -1471,29 +2259,29 @@ class DataStore:
         *,
         save: bool = True,
     ) -> Dict[str, Any]:
-        self._ensure_store_fresh()
         timestamp = _now_ts()
         thinking_val = float(thinking)
         implementation_val = float(implementation)
-        overall_val = _calc_overall(thinking_val, implementation_val)
+        overall_val = _calc_overall(round(thinking_val, 1), round(implementation_val, 1))
         quality_val = None if quality is None else float(quality)
         store_keys: Set[str] = set()
         with self._votes_lock:
+            self._ensure_store_fresh(force=True)
             bucket = self._get_vote_bucket(problem_id)
             existing = None
-            for vote in bucket:
-                if vote.get("user_id") == user_id:
-                    existing = vote
-                    break
+            # The owner index says whether this is a re-vote; only then is the bucket searched.
+            if problem_id in self._vote_problems_by_user.get(user_id, ()):
+                for vote in bucket:
+                    if vote.get("user_id") == user_id:
+                        existing = vote
+                        break
             if existing:
-                self._adjust_problem_stats(
-                    problem_id,
-                    thinking=existing.get("thinking"),
-                    implementation=existing.get("implementation"),
-                    overall=existing.get("overall") or existing.get("difficulty"),
-                    quality=existing.get("quality"),
-                    remove=True,
-                )
+                previous = {
+                    "thinking": existing.get("thinking"),
+                    "implementation": existing.get("implementation"),
+                    "overall": existing.get("overall") or existing.get("difficulty"),
+                    "quality": existing.get("quality"),
+                }
                 existing.update({
                     "thinking": thinking_val,
                     "implementation": implementation_val,
@@ -1510,6 +2298,12 @@ class DataStore:
                 self._register_vote(existing)
                 self._snapshot_upsert(existing)
                 self._votes_dirty.add(problem_id)
+                self._replace_problem_stats(problem_id, previous, {
+                    "thinking": thinking_val,
+                    "implementation": implementation_val,
+                    "overall": overall_val,
+                    "quality": quality_val,
+                })
                 target_vote = existing
             else:
                 vote_id = self.store["next_vote_id"]
@@ -1537,19 +2331,17 @@ class DataStore:
                 self._snapshot_upsert(vote)
                 target_vote = vote
                 self._votes_dirty.add(problem_id)
-            self._adjust_problem_stats(
-                problem_id,
-                thinking=thinking_val,
-                implementation=implementation_val,
-                overall=overall_val,
-                quality=quality_val,
-            )
+                self._adjust_problem_stats(
+                    problem_id,
+                    thinking=thinking_val,
+                    implementation=implementation_val,
+                    overall=overall_val,
+                    quality=quality_val,
+                )
         if save:
             self._save_vote_bucket(problem_id)
             if store_keys:
                 self._save_store(*store_keys)
-            else:
-                self._save_store()
         return target_vote
 
     def _adjust_problem_stats(
@@ -1562,68 +2354,120 @@ class DataStore:
         quality: Optional[float],
         remove: bool = False,
         update_median: bool = True,
+        materialize: bool = True,
     ) -> None:
+        """Apply one vote to a problem's running sums.
+
+        Batch callers pass ``materialize=False`` and ``update_median=False`` and
+        call ``_materialize_problem_stats``/``_update_problem_medians`` once per
+        touched problem afterwards.
+        """
+
         problem = self.problem_map.get(problem_id)
         if not problem:
             return
-        stats = problem.get("_stats", {})
-        if not stats:
-            return
-
-        def update_metric(metric: str, value: Optional[float]) -> None:
-            if value is None or metric not in stats:
-                return
-            block = stats[metric]
+        stats = self._problem_stats(problem)
+
+        for metric, value in (
+            ("thinking", thinking),
+            ("implementation", implementation),
+            ("overall", overall),
+            ("quality", quality),
+        ):
+            if value is None:
+                continue
+            block = stats.get(metric)
+            if block is None:
+                continue
             if remove:
-                block["count"] = max(0, block["count"] - 1)
-                block["sum"] -= value
-                block["sum_sq"] -= value ** 2
-                if block["count"] <= 0:
-                    block["sum"] = 0.0
-                    block["sum_sq"] = 0.0
+                _update_metric(block, value, None)
             else:
-                block["count"] += 1
-                block["sum"] += value
-                block["sum_sq"] += value ** 2
-            block["sum_sq"] = max(0.0, block["sum_sq"])
-            mapping = PROBLEM_STATS_SPECS[metric]
-            count = block["count"]
-            if count <= 0:
-                problem[mapping["cnt"]] = 0
-                problem[mapping["avg"]] = None
-                problem[mapping["sd"]] = None
-                block["sum"] = 0.0
-                block["sum_sq"] = 0.0
-                return
-            avg = block["sum"] / count
-            variance = max(0.0, block["sum_sq"] / count - avg ** 2)
-            problem[mapping["cnt"]] = count
-            problem[mapping["avg"]] = avg
-            problem[mapping["sd"]] = variance ** 0.5
-
-        update_metric("thinking", thinking)
-        update_metric("implementation", implementation)
-        update_metric("overall", overall)
-        update_metric("quality", quality)
+                _update_metric(block, None, value)
+            if materialize:
+                _materialize_metric(problem, metric, block)
         if update_median:
             self._update_problem_medians(problem_id)
 
-    def _remove_votes_matching(self, predicate: Callable[[Dict[str, Any]], bool]) -> Tuple[int, List[int]]:
+    def _replace_problem_stats(
+        self,
+        problem_id: int,
+        old_values: Dict[str, Optional[float]],
+        new_values: Dict[str, Optional[float]],
+    ) -> None:
+        """Swap one vote's old metric values for new ones in a single delta.
+
+        Metrics whose value did not change are neither touched nor re-materialized,
+        and medians are only recomputed when something actually moved.
+        """
+
+        problem = self.problem_map.get(problem_id)
+        if not problem:
+            return
+        changed = False
+        for metric, block in self._problem_stats(problem).items():
+            if _update_metric(block, old_values.get(metric), new_values.get(metric)):
+                _materialize_metric(problem, metric, block)
+                changed = True
+        if changed:
+            self._update_problem_medians(problem_id)
+
+    def _subtract_problem_stats(self, problem_id: int, removed_totals: Dict[str, List[float]]) -> None:
+        """Take aggregated ``[count, sum, sum_sq]`` per metric out of a problem's running sums."""
+
+        problem = self.problem_map.get(problem_id)
+        if not problem:
+            return
+        stats = self._problem_stats(problem)
+        for metric, (count, total, total_sq) in removed_totals.items():
+            block = stats.get(metric)
+            if block is None:
+                continue
+            block["count"] = max(0, block["count"] - int(count))
+            if block["count"] <= 0:
+                block["sum"] = 0.0
+                block["sum_sq"] = 0.0
+            else:
+                block["sum"] -= total
+                block["sum_sq"] = max(0.0, block["sum_sq"] - total_sq)
+
+    def _materialize_problem_stats(self, problem_id: int, metrics: Optional[Iterable[str]] = None) -> None:
+        """Refresh the displayed cnt/avg/sd fields, only for ``metrics`` when given."""
+
+        problem = self.problem_map.get(problem_id)
+        if not problem:
+            return
+        stats = problem.get("_stats", {})
+        for metric in stats if metrics is None else metrics:
+            block = stats.get(metric)
+            if block is not None:
+                _materialize_metric(problem, metric, block)
+
+    def _remove_votes_matching(
+        self,
+        predicate: Callable[[Dict[str, Any]], bool],
+        *,
+        problem_ids: Optional[Set[int]] = None,
+    ) -> Tuple[int, List[int]]:
+        """Remove every vote matching ``predicate``, optionally only from the given problems' buckets."""
+
         removed_vote_ids: List[int] = []
         cleared = 0
         problems_changed: Set[int] = set()
         with self._votes_lock:
-            problem_ids: Set[int] = set(self._votes_cache.keys())
-            for path in self._iter_vote_files():
-                try:
-                    problem_ids.add(int(path.stem))
-                except (TypeError, ValueError):
-                    continue
+            if problem_ids is None:
+                problem_ids = set(self._votes_cache.keys())
+                for path in self._iter_vote_files():
+                    try:
+                        problem_ids.add(int(path.stem))
+                    except (TypeError, ValueError):
+                        continue
             for problem_id in sorted(problem_ids):
                 bucket = self._get_vote_bucket(problem_id)
                 if not bucket:
                     continue
                 original_len = len(bucket)
+                # metric -> [count, sum, sum_sq] removed from this problem
+                removed_totals: Dict[str, List[float]] = {}
                 for vote in list(bucket):
                     if not predicate(vote):
                         continue
@@ -1636,16 +2480,26 @@ class DataStore:
                         removed_vote_ids.append(vote_id)
                         self._deregister_vote(vote)
                     if not vote.get("deleted"):
-                        self._adjust_problem_stats(
-                            problem_id,
-                            thinking=vote.get("thinking"),
-                            implementation=vote.get("implementation"),
-                            overall=vote.get("overall") or vote.get("difficulty"),
-                            quality=vote.get("quality"),
-                            remove=True,
-                        )
+                        for metric, value in (
+                            ("thinking", vote.get("thinking")),
+                            ("implementation", vote.get("implementation")),
+                            ("overall", vote.get("overall") or vote.get("difficulty")),
+                            ("quality", vote.get("quality")),
+                        ):
+                            if value is None:
+                                continue
+                            totals = removed_totals.get(metric)
+                            if totals is None:
+                                totals = removed_totals[metric] = [0, 0.0, 0.0]
+                            totals[0] += 1
+                            totals[1] += value
+                            totals[2] += value * value
                         cleared += 1
                     problems_changed.add(problem_id)
+                if removed_totals:
+                    self._subtract_problem_stats(problem_id, removed_totals)
+                    # Metrics none of the removed votes counted towards keep their values.
+                    self._materialize_problem_stats(problem_id, removed_totals)
                 if len(bucket) != original_len:
                     self._votes_dirty.add(problem_id)
             if removed_vote_ids:
@@ -1653,18 +2507,22 @@ class DataStore:
         if not removed_vote_ids and not problems_changed:
             return cleared, removed_vote_ids
         for problem_id in problems_changed:
+            self._update_problem_medians(problem_id)
             self._save_vote_bucket(problem_id)
-        reports = self.store.get("reports", [])
-        if removed_vote_ids and reports:
-            remaining_reports = [item for item in reports if item.get("vote_id") not in removed_vote_ids]
-            if len(remaining_reports) != len(reports):
-                self.store["reports"] = remaining_reports
-        self._save_store()
+        dropped: Set[int] = set()
+        for vote_id in removed_vote_ids:
+            for report in self._reports_by_vote.pop(vote_id, ()):
+                dropped.add(id(report))
+        if dropped:
+            self.store["reports"] = [item for item in self.store.get("reports", []) if id(item) not in dropped]
+            self._save_store("reports")
         return cleared, removed_vote_ids
 
-    def list_votes_for_problem(self, problem_id: int) -> List[Dict[str, Any]]:
+    def list_votes_for_problem(self, problem_id: int) -> List[Mapping[str, Any]]:
+        """Return read-only views of a problem's votes; copy one before changing it."""
+
         self._ensure_store_fresh()
-        return self._get_vote_bucket(problem_id, clone=True)
+        return [MappingProxyType(vote) for vote in self._get_vote_bucket(problem_id)]
 
     def find_vote_by_id(self, vote_id: int) -> Optional[Dict[str, Any]]:
         self._ensure_store_fresh()
@@ -1674,65 +2532,107 @@ class DataStore:
             return None
         if target_id <= 0:
             return None
-        with self._votes_lock:
-            problem_id = self._vote_index.get(target_id)
-        if problem_id is not None:
-            for vote in self._get_vote_bucket(problem_id, clone=True):
-                if vote.get("id") == target_id:
-                    return vote
-        for _, vote in self._iter_all_votes():
+        # The index covers every bucket (it is rebuilt whenever the store reloads),
+        # so an id it does not know is not worth a scan of every vote file.
+        problem_id = self._vote_index.get(target_id)
+        if problem_id is None:
+            return None
+        for vote in self._get_vote_bucket(problem_id):
             if vote.get("id") == target_id:
                 return dict(vote)
         return None
 
-    def mark_vote_deleted(self, vote_id: int) -> bool:
+    def find_user_vote(self, user_id: int, problem_id: int) -> Optional[Dict[str, Any]]:
         self._ensure_store_fresh()
-        cleared, removed_ids = self._remove_votes_matching(lambda vote: vote.get("id") == vote_id)
-        return bool(removed_ids or cleared)
+        if problem_id not in self._vote_problems_by_user.get(user_id, ()):
+            return None
+        for vote in self._get_vote_bucket(problem_id):
+            if vote.get("user_id") == user_id:
+                return dict(vote)
+        return None
+
+    def list_votes_for_user(self, user_id: int) -> List[Mapping[str, Any]]:
+        """Return read-only views of every vote ``user_id`` has cast, in vote id order."""
 
-    def mark_votes_deleted_bulk(self, vote_ids: List[int]) -> int:
         self._ensure_store_fresh()
-        try:
-            target_ids = {int(vote_id) for vote_id in vote_ids}
-        except (TypeError, ValueError):
-            target_ids = set()
-        if not target_ids:
-            return 0
-        cleared, _ = self._remove_votes_matching(lambda vote: vote.get("id") in target_ids)
-        return cleared
+        votes: List[Mapping[str, Any]] = []
+        for problem_id in sorted(self._vote_problems_by_user.get(user_id, ())):
+            for vote in self._get_vote_bucket(problem_id):
+                if vote.get("user_id") == user_id:
+                    votes.append(MappingProxyType(vote))
+        votes.sort(key=lambda vote: vote.get("id", 0))
+        return votes
 
-    def report_vote(self, vote_id: int, user_id: int) -> Tuple[bool, Optional[str]]:
+    def count_votes(self) -> int:
         self._ensure_store_fresh()
-        try:
-            vote_id_int = int(vote_id)
-            reporter_id = int(user_id)
-        except (TypeError, ValueError):
-            return False, "Invalid vote"
-        if vote_id_int <= 0 or reporter_id <= 0:
-            return False, "Invalid vote"
-        vote = self.find_vote_by_id(vote_id_int)
-        if not vote or vote.get("deleted"):
-            return False, "Vote not found"
-        for report in self.store.get("reports", []):
-            if report.get("vote_id") == vote_id_int and report.get("user_id") == reporter_id:
-                return False, "Already reported"
-        report_id = max(1, int(self.store.get("next_report_id", 1) or 1))
-        self.store["next_report_id"] = report_id + 1
-        target_user_id = None
-        try:
-            target_user_id = int(vote.get("user_id") or 0) or None
-        except (TypeError, ValueError):
+        return len(self._votes_snapshot)
+
+    def mark_vote_deleted(self, vote_id: int) -> bool:
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            problem_id = self._vote_index.get(vote_id)
+            if problem_id is None:
+                return False
+            cleared, removed_ids = self._remove_votes_matching(
+                lambda vote: vote.get("id") == vote_id,
+                problem_ids={problem_id},
+            )
+            return bool(removed_ids or cleared)
+
+    def mark_votes_deleted_bulk(self, vote_ids: List[int]) -> int:
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            try:
+                target_ids = {int(vote_id) for vote_id in vote_ids}
+            except (TypeError, ValueError):
+                target_ids = set()
+            if not target_ids:
+                return 0
+            vote_index = self._vote_index
+            problem_ids = {vote_index[vote_id] for vote_id in target_ids if vote_id in vote_index}
+            if not problem_ids:
+                return 0
+            cleared, _ = self._remove_votes_matching(
+                lambda vote: vote.get("id") in target_ids,
+                problem_ids=problem_ids,
+            )
+            return cleared
+
+    def report_vote(self, vote_id: int, user_id: int) -> Tuple[bool, Optional[str]]:
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            try:
+                vote_id_int = int(vote_id)
+                reporter_id = int(user_id)
+            except (TypeError, ValueError):
+                return False, "Invalid vote"
+            if vote_id_int <= 0 or reporter_id <= 0:
+                return False, "Invalid vote"
+            vote = self.find_vote_by_id(vote_id_int)
+            if not vote or vote.get("deleted"):
+                return False, "Vote not found"
+            for report in self._reports_by_vote.get(vote_id_int, ()):
+                if report.get("user_id") == reporter_id:
+                    return False, "Already reported"
+            report_id = max(1, int(self.store.get("next_report_id", 1) or 1))
+            self.store["next_report_id"] = report_id + 1
             target_user_id = None
-        self.store.setdefault("reports", []).append({
-            "id": report_id,
-            "vote_id": vote_id_int,
-            "user_id": reporter_id,
-            "reporter_id": reporter_id,
-            "target_user_id": target_user_id,
-            "created_at": _now_ts(),
-        })
-        self._save_store()
-        return True, None
+            try:
+                target_user_id = int(vote.get("user_id") or 0) or None
+            except (TypeError, ValueError):
+                target_user_id = None
+            report = {
+                "id": report_id,
+                "vote_id": vote_id_int,
+                "user_id": reporter_id,
+                "reporter_id": reporter_id,
+                "target_user_id": target_user_id,
+                "created_at": _now_ts(),
+            }
+            self.store.setdefault("reports", []).append(report)
+            self._reports_by_vote.setdefault(vote_id_int, []).append(report)
+            self._save_store("reports", "next_report_id")
+            return True, None
 
     def list_reports(self) -> List[Dict[str, Any]]:
         self._ensure_store_fresh()
@@ -1752,76 +2652,71 @@ class DataStore:
         return None
 
     def remove_report(self, report_id: int) -> bool:
-        self._ensure_store_fresh()
-        try:
-            rid = int(report_id)
-        except (TypeError, ValueError):
-            return False
-        if rid <= 0:
-            return False
-        reports = self.store.get("reports", [])
-        before = len(reports)
-        self.store["reports"] = [report for report in reports if report.get("id") != rid]
-        if len(self.store["reports"]) != before:
-            self._save_store()
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            try:
+                rid = int(report_id)
+            except (TypeError, ValueError):
+                return False
+            if rid <= 0:
+                return False
+            report = _pop_by_id(self.store.get("reports", []), rid)
+            if report is None:
+                return False
+            siblings = self._reports_by_vote.get(report.get("vote_id"), [])
+            if report in siblings:
+                siblings.remove(report)
+            self._save_store("reports")
             return True
-        return False
 
     # Problem mutations -------------------------------------------------
 
     def apply_problem_edit(self, pid: int, payload: Dict[str, Any]) -> bool:
-        self._ensure_store_fresh()
-        problem = self.problem_map.get(pid)
-        if not problem:
-            return False
-        problem.update(payload)
-        self.store.setdefault("problem_overrides", {})[str(pid)] = payload
-        self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            problem = self.problem_map.get(pid)
+            if not problem:
+                return False
+            problem.update(payload)
+            self.store.setdefault("problem_overrides", {})[str(pid)] = payload
+            self._save_store("problem_overrides")
+            return True
 
     def create_problem(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        self._ensure_store_fresh()
-        problem_id = self.store["next_problem_id"]
-        self.store["next_problem_id"] += 1
-        payload = dict(payload)
-        payload.setdefault("meta", {})
-        payload.setdefault("setter", [])
-        payload.setdefault("source", [])
-        payload.setdefault("url", "")
-        payload.setdefault("description", "")
-        payload.setdefault("contest", "")
-        payload.setdefault("tags", [])
-        payload.setdefault("knowledge_difficulty", None)
-        payload.setdefault("avg_difficulty", None)
-        payload.setdefault("avg_quality", None)
-        payload.setdefault("sd_difficulty", None)
-        payload.setdefault("sd_quality", None)
-        payload.setdefault("cnt1", 0)
-        payload.setdefault("cnt2", 0)
-        payload.setdefault("medium_difficulty", None)
-        payload.setdefault("medium_quality", None)
-        payload["id"] = problem_id
-        payload["is_custom"] = True
-        meta = payload.setdefault("meta", {})
-        meta.setdefault("tags", list(payload.get("tags", [])))
-        if payload.get("knowledge_difficulty"):
-            meta.setdefault("knowledge_difficulty", payload["knowledge_difficulty"])
-        self._init_problem_stats(payload)
-        self.store.setdefault("custom_problems", []).append(payload)
-        self.problem_map[problem_id] = payload
-        bucket = self.problems_by_type.setdefault(payload["type"], {"type": self.types.get(payload["type"], {"id": payload["type"], "name": ""}), "problems": []})
-        bucket["problems"].append(payload)
-        self._save_store()
-        return payload
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            problem_id = self.store["next_problem_id"]
+            self.store["next_problem_id"] += 1
+            payload = {**CUSTOM_PROBLEM_DEFAULTS, **payload}
+            # The list/dict fields must not share the template's objects.
+            for key in ("setter", "source", "tags"):
+                if payload[key] is None:
+                    payload[key] = []
+            if payload["meta"] is None:
+                payload["meta"] = {}
+            payload["id"] = problem_id
+            payload["is_custom"] = True
+            meta = payload["meta"]
+            meta.setdefault("tags", list(payload.get("tags", [])))
+            if payload.get("knowledge_difficulty"):
+                meta.setdefault("knowledge_difficulty", payload["knowledge_difficulty"])
+            self._init_problem_stats(payload)
+            self.store.setdefault("custom_problems", []).append(payload)
+            self.problem_map[problem_id] = payload
+            self.custom_problem_ids.add(problem_id)
+            self._problems_bucket(payload["type"])["problems"][problem_id] = payload
+            self._type_problem_lists.pop(payload["type"], None)
+            self._save_store("custom_problems", "next_problem_id")
+            return payload
 
     def delete_problem(self, problem_id: int) -> bool:
-        self._ensure_store_fresh()
-        custom_ids = {problem["id"] for problem in self.store.get("custom_problems", [])}
-        if problem_id not in custom_ids:
-            raise ValueError("只能删除自定义题目")
-        if not self._delete_problem(problem_id, require_custom=False, save=True):
-            raise ValueError("题目不存在或无法删除")
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            if problem_id not in self.custom_problem_ids:
+                raise ValueError("只能删除自定义题目")
+            if not self._delete_problem(problem_id, require_custom=False, save=True):
+                raise ValueError("题目不存在或无法删除")
+            return True
 
     def update_problem_meta(
         self,
@@ -1831,41 +2726,42 @@ class DataStore:
         *,
         save: bool = True,
     ) -> bool:
-        self._ensure_store_fresh()
-        problem = self.problem_map.get(problem_id)
-        if not problem:
-            return False
-        cleaned_tags: List[str] = []
-        seen = set()
-        for tag in tags or []:
-            tag_str = str(tag).strip()
-            if tag_str and tag_str not in seen:
-                seen.add(tag_str)
-                cleaned_tags.append(tag_str)
-        knowledge_value = knowledge_difficulty.strip() if knowledge_difficulty else None
-        problem["tags"] = cleaned_tags
-        problem["knowledge_difficulty"] = knowledge_value
-        meta = problem.setdefault("meta", {})
-        meta["tags"] = cleaned_tags
-        if knowledge_value:
-            meta["knowledge_difficulty"] = knowledge_value
-        else:
-            meta.pop("knowledge_difficulty", None)
-        overrides = self.store.setdefault("problem_overrides", {})
-        entry = dict(overrides.get(str(problem_id), {}))
-        entry["tags"] = cleaned_tags
-        entry["knowledge_difficulty"] = knowledge_value
-        meta_override = dict(entry.get("meta", {}))
-        meta_override["tags"] = cleaned_tags
-        if knowledge_value:
-            meta_override["knowledge_difficulty"] = knowledge_value
-        else:
-            meta_override.pop("knowledge_difficulty", None)
-        entry["meta"] = meta_override
-        overrides[str(problem_id)] = entry
-        if save:
-            self._save_store()
-        return True
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            problem = self.problem_map.get(problem_id)
+            if not problem:
+                return False
+            cleaned_tags: List[str] = []
+            seen = set()
+            for tag in tags or []:
+                tag_str = str(tag).strip()
+                if tag_str and tag_str not in seen:
+                    seen.add(tag_str)
+                    cleaned_tags.append(tag_str)
+            knowledge_value = knowledge_difficulty.strip() if knowledge_difficulty else None
+            problem["tags"] = cleaned_tags
+            problem["knowledge_difficulty"] = knowledge_value
+            meta = problem.setdefault("meta", {})
+            meta["tags"] = cleaned_tags
+            if knowledge_value:
+                meta["knowledge_difficulty"] = knowledge_value
+            else:
+                meta.pop("knowledge_difficulty", None)
+            overrides = self.store.setdefault("problem_overrides", {})
+            entry = dict(overrides.get(str(problem_id), {}))
+            entry["tags"] = cleaned_tags
+            entry["knowledge_difficulty"] = knowledge_value
+            meta_override = dict(entry.get("meta", {}))
+            meta_override["tags"] = cleaned_tags
+            if knowledge_value:
+                meta_override["knowledge_difficulty"] = knowledge_value
+            else:
+                meta_override.pop("knowledge_difficulty", None)
+            entry["meta"] = meta_override
+            overrides[str(problem_id)] = entry
+            if save:
+                self._save_store("problem_overrides")
+            return True
 
     def can_user_edit_problem_meta(self, user: Optional[Dict[str, Any]], problem_id: int) -> bool:
         self._ensure_store_fresh()
@@ -1889,224 +2785,227 @@ class DataStore:
         votes_path: Path,
         problems_path: Optional[Path] = None,
     ) -> Dict[str, Any]:
-        self._ensure_store_fresh()
-        summary = {
-            "users_created": 0,
-            "users_updated": 0,
-            "tag_permissions_updated": 0,
-            "problems_created": 0,
-            "problems_updated": 0,
-            "votes_imported": 0,
-            "votes_updated": 0,
-            "skipped_votes": 0,
-        }
+        with self._store_lock:
+            self._ensure_store_fresh(force=True)
+            summary = {
+                "users_created": 0,
+                "users_updated": 0,
+                "tag_permissions_updated": 0,
+                "problems_created": 0,
+                "problems_updated": 0,
+                "votes_imported": 0,
+                "votes_updated": 0,
+                "skipped_votes": 0,
+            }
 
-        if not users_path.exists() or not votes_path.exists():
-            raise FileNotFoundError("缺少 legacy 配置文件")
-
-        legacy_users = json.loads(users_path.read_text(encoding="utf-8"))
-        legacy_votes_payload = json.loads(votes_path.read_text(encoding="utf-8"))
-        legacy_votes = legacy_votes_payload.get("votes", {})
-        legacy_comments = legacy_votes_payload.get("comments", {})
-        legacy_problem_metas = legacy_votes_payload.get("problem_metas", {})
-
-        legacy_urls: Dict[str, str] = {}
-        if problems_path and problems_path.exists():
-            lines = [line.strip() for line in problems_path.read_text(encoding="utf-8").splitlines() if line.strip()]
-            for idx in range(0, len(lines), 2):
-                title = lines[idx]
-                url = lines[idx + 1] if idx + 1 < len(lines) else ""
-                legacy_urls[title] = url
-
-        def ensure_category_id(name: str) -> int:
-            for category in self.store.get("course_categories", []):
-                if category.get("name") == name:
-                    return int(category.get("id"))
-            entry = self.create_category(name)
-            return entry["id"]
-
-        def ensure_course_id(name: str, category_id: int) -> int:
-            for type_id, info in self.types.items():
-                if info.get("name") == name:
-                    self.set_course_categories(type_id, [category_id])
-                    return type_id
-            entry = self.create_course(name, [category_id])
-            return entry["id"]
-
-        legacy_category_id = ensure_category_id("legacy")
-        legacy_course_id = ensure_course_id("25年暑期题单", legacy_category_id)
-
-        user_lookup = {user["username"].lower(): user for user in self.store.get("users", [])}
-        for username, info in legacy_users.items():
-            username_lower = username.lower()
-            created = False
-            if username_lower in user_lookup:
-                user = user_lookup[username_lower]
-                summary["users_updated"] += 1
-            else:
-                user = {
-                    "id": self.store["next_user_id"],
-                    "username": username,
-                    "password_hash": None,
-                    "legacy_password_hash": None,
-                    "is_admin": False,
-                    "luoguid": "",
-                    "info": "",
-                    "created_at": int(info.get("created_at", _now_ts())),
-                    "approved": True,
-                    "banned": False,
-                    "roles": [],
-                    "tag_permissions": [],
-                }
-                self.store["next_user_id"] += 1
-                self.store.setdefault("users", []).append(user)
-                user_lookup[username_lower] = user
-                summary["users_created"] += 1
-                created = True
-            user["legacy_password_hash"] = info.get("password")
-            if created or not user.get("password_hash"):
-                user["password_hash"] = user.get("password_hash")
-            user["is_admin"] = bool(info.get("is_admin"))
-            user["banned"] = bool(info.get("banned", False))
-            roles = set(user.get("roles", []))
-            if user["is_admin"]:
-                roles.add("admin")
-            else:
-                roles.discard("admin")
-            user["roles"] = sorted(roles)
-            perms_before = set(user.get("tag_permissions", []))
-            perms_after = set(perms_before)
-            for perm in info.get("tag_permissions", []) or []:
-                perm_str = str(perm).strip()
-                if perm_str:
-                    perms_after.add(perm_str)
-            if perms_after != perms_before:
-                user["tag_permissions"] = sorted(perms_after)
-                summary["tag_permissions_updated"] += 1
-
-        comment_lookup: Dict[Tuple[str, str], str] = {}
-        for problem_title, entries in legacy_comments.items():
-            for entry in entries or []:
-                author = str(entry.get("user", "")).strip()
-                text = str(entry.get("text", "")).strip()
-                if not author or not text:
-                    continue
-                key = (problem_title, author)
-                if key in comment_lookup:
-                    comment_lookup[key] = comment_lookup[key] + "\n" + text
+            if not users_path.exists() or not votes_path.exists():
+                raise FileNotFoundError("缺少 legacy 配置文件")
+
+            legacy_users = _json_loads(users_path.read_bytes())
+            legacy_votes_payload = _json_loads(votes_path.read_bytes())
+            legacy_votes = legacy_votes_payload.get("votes", {})
+            legacy_comments = legacy_votes_payload.get("comments", {})
+            legacy_problem_metas = legacy_votes_payload.get("problem_metas", {})
+
+            legacy_urls: Dict[str, str] = {}
+            if problems_path and problems_path.exists():
+                lines = [line.strip() for line in problems_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+                for idx in range(0, len(lines), 2):
+                    title = lines[idx]
+                    url = lines[idx + 1] if idx + 1 < len(lines) else ""
+                    legacy_urls[title] = url
+
+            def ensure_category_id(name: str) -> int:
+                for category in self.store.get("course_categories", []):
+                    if category.get("name") == name:
+                        return int(category.get("id"))
+                entry = self.create_category(name)
+                return entry["id"]
+
+            def ensure_course_id(name: str, category_id: int) -> int:
+                for type_id, info in self.types.items():
+                    if info.get("name") == name:
+                        self.set_course_categories(type_id, [category_id])
+                        return type_id
+                entry = self.create_course(name, [category_id])
+                return entry["id"]
+
+            legacy_category_id = ensure_category_id("legacy")
+            legacy_course_id = ensure_course_id("25年暑期题单", legacy_category_id)
+
+            user_lookup = {user["username"].lower(): user for user in self.store.get("users", [])}
+            for username, info in legacy_users.items():
+                username_lower = username.lower()
+                created = False
+                if username_lower in user_lookup:
+                    user = user_lookup[username_lower]
+                    summary["users_updated"] += 1
                 else:
-                    comment_lookup[key] = text
-
-        def derive_contest_name(title: str) -> str:
-            token = title[:6]
-            if token.isdigit():
-                year = int(token[:2])
-                month = int(token[2:4])
-                day = int(token[4:6])
-                year += 2000
-                try:
-                    return f"{year:04d}-{month:02d}-{day:02d}"
-                except ValueError:
-                    return token
-            return token if token else "Legacy"
-
-        for problem_title, votes in legacy_votes.items():
-            contest_name = derive_contest_name(problem_title)
-            existing_problem = None
-            bucket = self.problems_by_type.get(legacy_course_id, {}).get("problems", [])
-            for problem in bucket:
-                if problem.get("title") == problem_title:
-                    existing_problem = problem
-                    break
-            if existing_problem:
-                summary["problems_updated"] += 1
-            else:
-                payload = {
-                    "type": legacy_course_id,
-                    "contest": contest_name,
-                    "title": problem_title,
-                    "url": legacy_urls.get(problem_title, ""),
-                    "description": "",
-                }
-                existing_problem = self.create_problem(payload)
-                summary["problems_created"] += 1
-                bucket = self.problems_by_type.get(legacy_course_id, {}).get("problems", [])
-
-            if existing_problem.get("contest") != contest_name:
-                existing_problem["contest"] = contest_name
-            if not existing_problem.get("url") and legacy_urls.get(problem_title):
-                existing_problem["url"] = legacy_urls[problem_title]
-
-            meta_info = legacy_problem_metas.get(problem_title, {}) or {}
-            tags_text = meta_info.get("tags", "")
-            tags = [tag.strip() for tag in tags_text.split(",") if tag.strip()]
-            knowledge_level = meta_info.get("difficulty")
-            self.update_problem_meta(existing_problem["id"], tags, knowledge_level, save=False)
-
-            for vote in votes or []:
-                voter = str(vote.get("voter", "")).strip()
-                if not voter:
-                    summary["skipped_votes"] += 1
-                    continue
-                voter_user = user_lookup.get(voter.lower())
-                if not voter_user:
-                    summary["skipped_votes"] += 1
-                    continue
-                thinking_val = float(vote.get("thinking", vote.get("difficulty", 0)))
-                implementation_val = float(vote.get("implementing", vote.get("implementation", vote.get("difficulty", 0))))
-                quality_val = vote.get("quality")
-                comment = comment_lookup.get((problem_title, voter), "")
-                existing_vote = None
-                for entry in self.list_votes_for_problem(existing_problem["id"]):
-                    if entry.get("user_id") == voter_user["id"]:
-                        existing_vote = entry
+                    user = {
+                        "id": self.store["next_user_id"],
+                        "username": username,
+                        "password_hash": None,
+                        "legacy_password_hash": None,
+                        "is_admin": False,
+                        "luoguid": "",
+                        "info": "",
+                        "created_at": int(info.get("created_at", _now_ts())),
+                        "approved": True,
+                        "banned": False,
+                        "roles": [],
+                        "tag_permissions": [],
+                    }
+                    self.store["next_user_id"] += 1
+                    self.store.setdefault("users", []).append(user)
+                    self._index_user(user)
+                    user_lookup[username_lower] = user
+                    summary["users_created"] += 1
+                    created = True
+                user["legacy_password_hash"] = info.get("password")
+                if created or not user.get("password_hash"):
+                    user["password_hash"] = user.get("password_hash")
+                user["is_admin"] = bool(info.get("is_admin"))
+                user["banned"] = bool(info.get("banned", False))
+                roles = set(user.get("roles", []))
+                if user["is_admin"]:
+                    roles.add("admin")
+                else:
+                    roles.discard("admin")
+                user["roles"] = sorted(roles)
+                _refresh_user_status(user)
+                perms_before = set(user.get("tag_permissions", []))
+                perms_after = set(perms_before)
+                for perm in info.get("tag_permissions", []) or []:
+                    perm_str = str(perm).strip()
+                    if perm_str:
+                        perms_after.add(perm_str)
+                if perms_after != perms_before:
+                    user["tag_permissions"] = sorted(perms_after)
+                    summary["tag_permissions_updated"] += 1
+
+            comment_lookup: Dict[Tuple[str, str], str] = {}
+            for problem_title, entries in legacy_comments.items():
+                for entry in entries or []:
+                    author = str(entry.get("user", "")).strip()
+                    text = str(entry.get("text", "")).strip()
+                    if not author or not text:
+                        continue
+                    key = (problem_title, author)
+                    if key in comment_lookup:
+                        comment_lookup[key] = comment_lookup[key] + "\n" + text
+                    else:
+                        comment_lookup[key] = text
+
+            def derive_contest_name(title: str) -> str:
+                token = title[:6]
+                if token.isdigit():
+                    year = int(token[:2])
+                    month = int(token[2:4])
+                    day = int(token[4:6])
+                    year += 2000
+                    try:
+                        return f"{year:04d}-{month:02d}-{day:02d}"
+                    except ValueError:
+                        return token
+                return token if token else "Legacy"
+
+            for problem_title, votes in legacy_votes.items():
+                contest_name = derive_contest_name(problem_title)
+                existing_problem = None
+                bucket = self.problems_by_type.get(legacy_course_id, {}).get("problems", {})
+                for problem in bucket.values():
+                    if problem.get("title") == problem_title:
+                        existing_problem = problem
                         break
-                result = self.upsert_vote(
-                    voter_user["id"],
-                    existing_problem["id"],
-                    thinking_val,
-                    implementation_val,
-                    quality_val,
-                    comment,
-                    False,
-                    save=False,
-                )
-                if existing_vote:
-                    summary["votes_updated"] += 1
+                if existing_problem:
+                    summary["problems_updated"] += 1
                 else:
-                    summary["votes_imported"] += 1
-
-        self._flush_dirty_votes()
-        self._rebuild_problem_stats()
-        self._save_store()
-        return summary
+                    payload = {
+                        "type": legacy_course_id,
+                        "contest": contest_name,
+                        "title": problem_title,
+                        "url": legacy_urls.get(problem_title, ""),
+                        "description": "",
+                    }
+                    existing_problem = self.create_problem(payload)
+                    summary["problems_created"] += 1
+
+                if existing_problem.get("contest") != contest_name:
+                    existing_problem["contest"] = contest_name
+                if not existing_problem.get("url") and legacy_urls.get(problem_title):
+                    existing_problem["url"] = legacy_urls[problem_title]
+
+                meta_info = legacy_problem_metas.get(problem_title, {}) or {}
+                tags_text = meta_info.get("tags", "")
+                tags = [tag.strip() for tag in tags_text.split(",") if tag.strip()]
+                knowledge_level = meta_info.get("difficulty")
+                self.update_problem_meta(existing_problem["id"], tags, knowledge_level, save=False)
+
+                for vote in votes or []:
+                    voter = str(vote.get("voter", "")).strip()
+                    if not voter:
+                        summary["skipped_votes"] += 1
+                        continue
+                    voter_user = user_lookup.get(voter.lower())
+                    if not voter_user:
+                        summary["skipped_votes"] += 1
+                        continue
+                    thinking_val = float(vote.get("thinking", vote.get("difficulty", 0)))
+                    implementation_val = float(vote.get("implementing", vote.get("implementation", vote.get("difficulty", 0))))
+                    quality_val = vote.get("quality")
+                    comment = comment_lookup.get((problem_title, voter), "")
+                    existing_vote = None
+                    for entry in self.list_votes_for_problem(existing_problem["id"]):
+                        if entry.get("user_id") == voter_user["id"]:
+                            existing_vote = entry
+                            break
+                    result = self.upsert_vote(
+                        voter_user["id"],
+                        existing_problem["id"],
+                        thinking_val,
+                        implementation_val,
+                        quality_val,
+                        comment,
+                        False,
+                        save=False,
+                    )
+                    if existing_vote:
+                        summary["votes_updated"] += 1
+                    else:
+                        summary["votes_imported"] += 1
+
+            self._flush_dirty_votes()
+            self._rebuild_problem_stats()
+            self._save_store()
+            return summary
 
     def _delete_problem(self, problem_id: int, require_custom: bool, save: bool) -> bool:
-        problem = self.problem_map.get(problem_id)
-        if not problem:
-            return False
-        if require_custom:
-            custom_ids = {entry["id"] for entry in self.store.get("custom_problems", [])}
-            if problem_id not in custom_ids:
+        with self._store_lock:
+            problem = self.problem_map.get(problem_id)
+            if not problem:
                 return False
-        changed = False
-        custom_problems = self.store.get("custom_problems", [])
-        filtered_custom = [item for item in custom_problems if item.get("id") != problem_id]
-        if len(filtered_custom) != len(custom_problems):
-            self.store["custom_problems"] = filtered_custom
-            changed = True
-        overrides = self.store.get("problem_overrides", {})
-        if overrides.pop(str(problem_id), None) is not None:
-            changed = True
-        _, removed_vote_ids = self._remove_votes_matching(lambda vote: vote.get("problem_id") == problem_id)
-        if removed_vote_ids:
+            if require_custom and problem_id not in self.custom_problem_ids:
+                return False
+            changed = False
+            if _pop_by_id(self.store.get("custom_problems", []), problem_id) is not None:
+                changed = True
+            self.custom_problem_ids.discard(problem_id)
+            overrides = self.store.get("problem_overrides", {})
+            if overrides.pop(str(problem_id), None) is not None:
+                changed = True
+            _, removed_vote_ids = self._remove_votes_matching(
+                lambda vote: vote.get("problem_id") == problem_id,
+                problem_ids={problem_id},
+            )
+            if removed_vote_ids:
+                changed = True
+            type_id = problem.get("type")
+            bucket = self.problems_by_type.get(type_id)
+            if bucket:
+                bucket["problems"].pop(problem_id, None)
+            self._type_problem_lists.pop(type_id, None)
+            self.problem_map.pop(problem_id, None)
             changed = True
-        type_id = problem.get("type")
-        bucket = self.problems_by_type.get(type_id)
-        if bucket:
-            bucket["problems"] = [entry for entry in bucket.get("problems", []) if entry.get("id") != problem_id]
-        self.problem_map.pop(problem_id, None)
-        changed = True
-        if changed and save:
-            self._save_store()
-        return True
+            if changed and save:
+                self._save_store("custom_problems", "problem_overrides")
+            return True
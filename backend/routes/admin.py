@@ -39,7 +39,7 @@ def register_admin_routes(app) -> None:
         stats = {
             "total_users": len(datastore.store.get("users", [])),
             "total_problems": len(datastore.problem_map),
-            "total_votes": len(datastore.store.get("votes", [])),
+            "total_votes": datastore.count_votes(),
         }
         announcements = datastore.list_announcements()
         courses = datastore.list_types()
@@ -58,20 +58,27 @@ def register_admin_routes(app) -> None:
     def admin_reports() -> Any:
         require_admin()
         raw_reports = datastore.list_reports()
-        entries = []
+        rows = []
+        user_ids = set()
         for report in sorted(raw_reports, key=lambda item: item.get("created_at", 0), reverse=True):
             vote = datastore.find_vote_by_id(report.get("vote_id")) if report.get("vote_id") else None
-            reporter = datastore.find_user_by_id(report.get("user_id")) if report.get("user_id") else None
             target_user_id = report.get("target_user_id")
             if not target_user_id and vote:
                 target_user_id = vote.get("user_id")
-            target = datastore.find_user_by_id(target_user_id) if target_user_id else None
+            if report.get("user_id"):
+                user_ids.add(report.get("user_id"))
+            if target_user_id:
+                user_ids.add(target_user_id)
+            rows.append((report, vote, target_user_id))
+        users = datastore.find_users_bulk(user_ids)
+        entries = []
+        for report, vote, target_user_id in rows:
             problem = datastore.get_problem(vote.get("problem_id")) if vote else None
             entries.append({
                 "report": report,
                 "vote": vote,
-                "reporter": reporter,
-                "target": target,
+                "reporter": users.get(report.get("user_id")) if report.get("user_id") else None,
+                "target": users.get(target_user_id) if target_user_id else None,
                 "problem": problem,
             })
         default_id, default_name = _global_default_info()
@@ -112,11 +119,12 @@ def register_admin_routes(app) -> None:
             datastore.remove_report(report_id)
             flash("举报人信息缺失，已忽略该举报", "warning")
             return redirect(url_for("admin_reports"))
-        if datastore.set_banned(reporter_id, True):
-            flash("举报人账户已封禁", "warning")
-        else:
-            flash("封禁失败，未找到举报人账户", "error")
-        datastore.remove_report(report_id)
+        with datastore.batch_writes():
+            if datastore.set_banned(reporter_id, True):
+                flash("举报人账户已封禁", "warning")
+            else:
+                flash("封禁失败，未找到举报人账户", "error")
+            datastore.remove_report(report_id)
         return redirect(url_for("admin_reports"))
 
     @app.post("/admin/reports/<int:report_id>/ban-target")
@@ -145,11 +153,12 @@ def register_admin_routes(app) -> None:
             datastore.remove_report(report_id)
             flash("未找到被举报账户信息，已忽略该举报", "warning")
             return redirect(url_for("admin_reports"))
-        if datastore.set_banned(target_user_id, True):
-            flash("被举报账户已封禁", "warning")
-        else:
-            flash("封禁失败，未找到被举报账户", "error")
-        datastore.remove_report(report_id)
+        with datastore.batch_writes():
+            if datastore.set_banned(target_user_id, True):
+                flash("被举报账户已封禁", "warning")
+            else:
+                flash("封禁失败，未找到被举报账户", "error")
+            datastore.remove_report(report_id)
         return redirect(url_for("admin_reports"))
 
     @app.post("/admin/reports/<int:report_id>/delete-vote")
@@ -168,12 +177,13 @@ def register_admin_routes(app) -> None:
             datastore.remove_report(report_id)
             flash("举报缺少有效的评分，已忽略", "warning")
             return redirect(url_for("admin_reports"))
-        removed = datastore.mark_vote_deleted(vote_id)
-        if removed:
-            flash("评分已删除", "success")
-        else:
-            flash("评分不存在或已删除", "warning")
-        datastore.remove_report(report_id)
+        with datastore.batch_writes():
+            removed = datastore.mark_vote_deleted(vote_id)
+            if removed:
+                flash("评分已删除", "success")
+            else:
+                flash("评分不存在或已删除", "warning")
+            datastore.remove_report(report_id)
         return redirect(url_for("admin_reports"))
 
     @app.route("/admin/users")
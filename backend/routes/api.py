@@ -39,13 +39,13 @@ def register_api_routes(app) -> None:
             type_id = 0
         payload = datastore.get_type_payload(type_id)
         if not payload:
-            fallback_id = datastore.resolve_start_course_id(getattr(g, "user", None))
+            fallback_id = datastore.resolve_start_course_id(g.user)
             if fallback_id is not None:
                 payload = datastore.get_type_payload(fallback_id)
                 type_id = fallback_id
             if not payload:
                 payload = {"type": {"id": type_id, "name": ""}, "problems": []}
-        active_user = getattr(g, "user", None)
+        active_user = g.user
         for item in payload.get("problems", []):
             item.setdefault("tags", item.get("tags") or item.get("meta", {}).get("tags", []))
             knowledge = item.get("knowledge_difficulty") or item.get("meta", {}).get("knowledge_difficulty")
@@ -67,8 +67,8 @@ def register_api_routes(app) -> None:
         except ValueError:
             type_id = 0
         voted = []
-        for vote in datastore.store.get("votes", []):
-            if vote["user_id"] == user["id"] and not vote.get("deleted"):
+        for vote in datastore.list_votes_for_user(user["id"]):
+            if not vote.get("deleted"):
                 problem = datastore.get_problem(vote["problem_id"])
                 if not problem:
                     continue
@@ -89,11 +89,9 @@ def register_api_routes(app) -> None:
         problem = datastore.get_problem(problem_id)
         if not problem:
             return jsonify({"error": "Problem not found"})
-        existing = None
-        for vote in datastore.store.get("votes", []):
-            if vote["user_id"] == user["id"] and vote["problem_id"] == problem_id and not vote.get("deleted"):
-                existing = vote
-                break
+        existing = datastore.find_user_vote(user["id"], problem_id)
+        if existing and existing.get("deleted"):
+            existing = None
         default_thinking = existing.get("thinking") if existing else float(problem.get("avg_thinking") or problem.get("avg_difficulty") or 2000)
         default_implementation = existing.get("implementation") if existing else float(problem.get("avg_implementation") or problem.get("avg_difficulty") or 2000)
         default_quality = existing.get("quality") if existing else float(problem.get("avg_quality") or 3.0)
@@ -258,12 +256,14 @@ def register_api_routes(app) -> None:
         avg_quality = float(problem.get("avg_quality") or 0)
         is_admin = bool(g.user and g.user.get("is_admin"))
         rows = []
-        for vote in datastore.list_votes_for_problem(problem_id):
+        votes = datastore.list_votes_for_problem(problem_id)
+        users = datastore.find_users_bulk(vote["user_id"] for vote in votes)
+        for vote in votes:
             if vote.get("deleted"):
                 continue
             if not is_admin and not vote.get("public"):
                 continue
-            vote_user = datastore.find_user_by_id(vote["user_id"])
+            vote_user = users.get(vote["user_id"])
             if not vote_user:
                 continue
             thinking = vote.get("thinking")
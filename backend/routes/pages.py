@@ -16,7 +16,7 @@ def register_page_routes(app) -> None:
     @app.route("/")
     def index() -> str:
         groups = datastore.list_type_groups()
-        default_course_id = datastore.resolve_start_course_id(getattr(g, "user", None))
+        default_course_id = datastore.resolve_start_course_id(g.user)
         return render_template(
             "index.html",
             course_groups=groups,
@@ -90,15 +90,11 @@ def register_page_routes(app) -> None:
         user = datastore.find_user_by_id(user_id)
         if not user:
             abort(404)
-        viewer = getattr(g, "user", None)
+        viewer = g.user
         is_admin = bool(viewer and viewer.get("is_admin"))
         is_profile_owner = bool(viewer and viewer.get("id") == user_id)
         can_view_private = is_admin or is_profile_owner
-        votes = [
-            vote
-            for vote in datastore.store.get("votes", [])
-            if vote["user_id"] == user_id and not vote.get("deleted")
-        ]
+        votes = [vote for vote in datastore.list_votes_for_user(user_id) if not vote.get("deleted")]
         votes.sort(key=lambda x: -x.get("created_at", 0))
         enriched = []
         difficulty_deltas = []
@@ -165,10 +161,12 @@ def register_page_routes(app) -> None:
         is_admin = bool(g.user and g.user.get("is_admin"))
         public_votes = []
         admin_votes = []
-        for vote in datastore.list_votes_for_problem(problem_id):
+        votes = datastore.list_votes_for_problem(problem_id)
+        users = datastore.find_users_bulk(vote["user_id"] for vote in votes)
+        for vote in votes:
             if vote.get("deleted"):
                 continue
-            user = datastore.find_user_by_id(vote["user_id"])
+            user = users.get(vote["user_id"])
             if not user:
                 continue
             entry = {
@@ -23,10 +23,11 @@ PROBLEMS_PATH = DATA_DIR / "problems.json"
 def _load_json(path: Path, default: Any) -> Any:
     if not path.exists():
         return default
-    text = path.read_text(encoding="utf-8").strip()
-    if not text:
+    data = path.read_bytes().strip()
+    if not data:
         return default
-    return json.loads(text)
+    # json.loads detects the UTF-8 encoding itself, so skip building an intermediate str.
+    return json.loads(data)
 
 
 def _save_json(path: Path, payload: Any) -> None:
@@ -218,6 +219,7 @@ def main() -> None:
     datastore = DataStore()
     datastore._rebuild_problem_stats()
     datastore._save_store()
+    datastore.flush()
 
     remaining = sorted(custom_type_ids) if custom_type_ids else []
     print("Removed problems:", removed_problems)